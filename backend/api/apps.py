@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete
 
 
 class ApiConfig(AppConfig):
-    default_auto_field = "django.db.models.BigAutoField"
-    name = "api"
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+
+        from backend_foodgram import checks  # noqa: F401
+
+        from .authentication import invalidate_token
+
+        post_delete.connect(invalidate_token, sender=Token)
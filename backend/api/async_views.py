@@ -0,0 +1,255 @@
+"""
+Нативные async-представления для самых нагруженных GET-запросов.
+
+Под ASGI они обслуживают чтение без перехода в поток на каждый запрос
+DRF. Всё, что они не воспроизводят один в один (запись, неверный токен,
+некорректная страница, несуществующий объект, рецепт без готового
+документа), передаётся синхронным представлениям DRF, поэтому ответы
+совпадают с ними.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from constants import PAGE_SIZE
+from recipes.documents import author_profiles, authors_queryset, render
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeDocument,
+                            ShoppingCart, Subscriber, User)
+from recipes.popularity import order_by_popularity
+from recipes.search import search_recipes
+from .authentication import token_cache
+from .throttling import AnonReadThrottle
+from .views import IngredientsViewSet, RecipesViewSet
+
+TRUE_VALUES = ('1', 'true', 'True')
+FALSE_VALUES = ('0', 'false', 'False')
+
+recipe_list_view = sync_to_async(
+    RecipesViewSet.as_view({'get': 'list', 'post': 'create'})
+)
+recipe_detail_view = sync_to_async(RecipesViewSet.as_view({
+    'get': 'retrieve', 'put': 'update',
+    'patch': 'partial_update', 'delete': 'destroy',
+}))
+ingredient_list_view = sync_to_async(
+    IngredientsViewSet.as_view({'get': 'list'})
+)
+
+
+class Fallback(Exception):
+    """Запрос нужно отдать синхронному представлению DRF."""
+
+
+def json_response(data):
+    return JsonResponse(
+        data, safe=False, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+async def authenticate(request):
+    """
+    Аналог CachedTokenAuthentication на async ORM. Заодно проверяет лимит
+    анонимного чтения: сверх лимита запрос уходит в DRF, который и
+    вернёт 429.
+    """
+
+    header = request.META.get('HTTP_AUTHORIZATION')
+    if not header:
+        if not await AnonReadThrottle().aallow_request(request, None):
+            raise Fallback
+        return None
+    parts = header.split()
+    if len(parts) != 2 or parts[0].lower() != 'token':
+        raise Fallback
+    user_id = await token_cache.aget(parts[1])
+    if user_id is None:
+        try:
+            token = await Token.objects.select_related('user').aget(
+                key=parts[1]
+            )
+        except Token.DoesNotExist:
+            raise Fallback
+        if not token.user.is_active:
+            raise Fallback
+        user = token.user
+        await token_cache.aset(parts[1], user.pk)
+    else:
+        user = await User.objects.filter(
+            pk=user_id, is_active=True
+        ).afirst()
+        if user is None:
+            raise Fallback
+    # Как в DRF: пользователь виден middleware (журнал трафика).
+    request.user = user
+    return user
+
+
+async def load_documents(request, recipe_ids, user):
+    """
+    Рецепты в порядке recipe_ids из готовых документов; если какого-то
+    документа нет, запрос уходит в DRF, который его соберёт.
+    """
+
+    documents = {
+        recipe_id: data async for recipe_id, data in
+        RecipeDocument.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'data')
+    }
+    if len(documents) < len(recipe_ids):
+        raise Fallback
+    documents = [documents[recipe_id] for recipe_id in recipe_ids]
+    authors = author_profiles([
+        row async for row in authors_queryset(documents)
+    ])
+    if any(document['author']['id'] not in authors
+           for document in documents):
+        raise Fallback
+    flags = await user_flags(user, documents)
+    return [
+        render(request, document, authors, *flags) for document in documents
+    ]
+
+
+async def user_flags(user, documents):
+    """Избранное, корзина и подписки пользователя тремя запросами."""
+
+    if user is None:
+        return set(), set(), set()
+    recipe_ids = [document['id'] for document in documents]
+    author_ids = {document['author']['id'] for document in documents}
+    favorited = {
+        pk async for pk in Favorite.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True)
+    }
+    in_cart = {
+        pk async for pk in ShoppingCart.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True)
+    }
+    subscribed = {
+        pk async for pk in Subscriber.objects.filter(
+            user=user, subscribed_to_id__in=author_ids
+        ).values_list('subscribed_to_id', flat=True)
+    }
+    return favorited, in_cart, subscribed
+
+
+def bool_param(request, name):
+    value = request.GET.get(name)
+    if value is None or value == '' or value in FALSE_VALUES:
+        return False
+    if value in TRUE_VALUES:
+        return True
+    raise Fallback
+
+
+def positive_int_param(request, name, default):
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    if not value.isdigit() or int(value) == 0:
+        raise Fallback
+    return int(value)
+
+
+async def _recipe_list(request):
+    user = await authenticate(request)
+    recipes = Recipe.objects.all()
+    author = request.GET.get('author')
+    if author:
+        if not author.isdigit():
+            raise Fallback
+        recipes = recipes.filter(author_id=author)
+    # Значения флагов проверяются и для анонимов, как в RecipeFilter.
+    is_favorited = bool_param(request, 'is_favorited')
+    is_in_shopping_cart = bool_param(request, 'is_in_shopping_cart')
+    if user is not None and is_favorited:
+        recipes = recipes.filter(favorites__user=user)
+    if user is not None and is_in_shopping_cart:
+        recipes = recipes.filter(shopping_cart_items__user=user)
+    search = request.GET.get('search')
+    if search:
+        recipes = search_recipes(recipes, search)
+    if request.GET.get('ordering') == 'popular':
+        recipes = order_by_popularity(recipes)
+
+    limit = request.GET.get('limit')
+    page_size = int(limit) if limit and limit.isdigit() and int(limit) \
+        else PAGE_SIZE
+    page = positive_int_param(request, 'page', 1)
+    count = await recipes.acount()
+    if not count and author \
+            and not await User.objects.filter(pk=author).aexists():
+        # Несуществующий автор: DRF отвечает 400 с ошибкой фильтра.
+        raise Fallback
+    if page > 1 and (page - 1) * page_size >= count:
+        raise Fallback
+    offset = (page - 1) * page_size
+    recipe_ids = [
+        recipe_id async for recipe_id in recipes.values_list(
+            'id', flat=True
+        )[offset:offset + page_size]
+    ]
+    results = await load_documents(request, recipe_ids, user)
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page + 1) \
+        if offset + page_size < count else None
+    if page == 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', page - 1)
+
+    return json_response({
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': results,
+    })
+
+
+@csrf_exempt
+async def recipe_list(request):
+    if request.method != 'GET':
+        return await recipe_list_view(request)
+    try:
+        return await _recipe_list(request)
+    except Fallback:
+        return await recipe_list_view(request)
+
+
+@csrf_exempt
+async def recipe_detail(request, pk):
+    if request.method != 'GET':
+        return await recipe_detail_view(request, pk=pk)
+    try:
+        user = await authenticate(request)
+        results = await load_documents(request, [pk], user)
+    except Fallback:
+        return await recipe_detail_view(request, pk=pk)
+    return json_response(results[0])
+
+
+@csrf_exempt
+async def ingredient_list(request):
+    if request.method != 'GET':
+        return await ingredient_list_view(request)
+    try:
+        await authenticate(request)
+    except Fallback:
+        return await ingredient_list_view(request)
+    ingredients = Ingredient.objects.all()
+    name = request.GET.get('name')
+    if name:
+        ingredients = ingredients.filter(name__istartswith=name)
+    return json_response([
+        ingredient async for ingredient in ingredients.values(
+            'id', 'name', 'measurement_unit'
+        )
+    ])
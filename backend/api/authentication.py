@@ -0,0 +1,130 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from backend_foodgram.lru import LRUCache
+from backend_foodgram.metrics import record_cache
+from backend_foodgram.profiling import profile_phase
+from recipes.models import User
+
+CACHE_KEY_PREFIX = 'auth_token:'
+# Значение TOKEN_AUTH_CACHE_ALIAS для кэша в памяти процесса.
+LOCAL_ALIAS = 'local'
+
+
+class TokenUserCache:
+    """
+    Кэш соответствия токен -> id пользователя.
+
+    Хранится только id: пользователь читается из БД на каждый запрос
+    (по первичному ключу, без таблицы токенов), поэтому смена пароля
+    или деактивация видны сразу, а представления сохраняют свежий
+    объект, а не копию из кэша.
+
+    По умолчанию хранится в кэше TOKEN_AUTH_CACHE_ALIAS, общем для
+    воркеров: выход (удаление токена) сбрасывает запись сразу для всех.
+    TOKEN_AUTH_CACHE_ALIAS=local включает LRU в памяти процесса - без
+    обращений к кэшу, но остальные воркеры принимают удалённый токен
+    ещё до TOKEN_AUTH_CACHE_TTL секунд.
+    """
+
+    def __init__(self):
+        self.ttl = settings.TOKEN_AUTH_CACHE_TTL
+        alias = settings.TOKEN_AUTH_CACHE_ALIAS
+        self.alias = None if alias == LOCAL_ALIAS else alias
+        self.local = LRUCache(settings.TOKEN_AUTH_CACHE_SIZE, self.ttl)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    @staticmethod
+    def _shared_key(key):
+        return CACHE_KEY_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        if self.alias:
+            user_id = caches[self.alias].get(self._shared_key(key))
+        else:
+            user_id = self.local.get(key)
+        record_cache('auth_token', user_id is not None)
+        return user_id
+
+    async def aget(self, key):
+        if self.enabled and self.alias:
+            user_id = await caches[self.alias].aget(self._shared_key(key))
+            record_cache('auth_token', user_id is not None)
+            return user_id
+        return self.get(key)
+
+    def set(self, key, user_id):
+        if not self.enabled:
+            return
+        if self.alias:
+            caches[self.alias].set(self._shared_key(key), user_id, self.ttl)
+        else:
+            self.local.set(key, user_id)
+
+    async def aset(self, key, user_id):
+        if self.enabled and self.alias:
+            await caches[self.alias].aset(
+                self._shared_key(key), user_id, self.ttl
+            )
+        else:
+            self.set(key, user_id)
+
+    def delete(self, keys):
+        if self.alias:
+            caches[self.alias].delete_many(
+                [self._shared_key(key) for key in keys]
+            )
+        for key in keys:
+            self.local.delete(key)
+
+
+token_cache = TokenUserCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без поиска токена на каждый запрос: id
+    пользователя берётся из token_cache, сам пользователь - из БД по
+    первичному ключу. Токен ищется только при промахе.
+    """
+
+    def authenticate(self, request):
+        with profile_phase('auth'):
+            return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        user_id = token_cache.get(key)
+        if user_id is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user.pk)
+            return user, token
+        user = User.objects.filter(pk=user_id, is_active=True).first()
+        if user is None:
+            token_cache.delete([key])
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return user, Token(key=key, user=user)
+
+
+def invalidate_token(sender, instance, **kwargs):
+    """
+    Выход из системы (djoser удаляет токен) и удаление пользователя.
+    Запись сбрасывается после коммита: до него параллельный запрос ещё
+    найдёт токен в БД и закэширует его снова.
+    """
+
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.delete([key]))
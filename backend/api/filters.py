@@ -1,6 +1,16 @@
 from django_filters.rest_framework import filters, FilterSet
 
-from recipes.models import Recipe
+from recipes.models import Ingredient, Recipe
+from recipes.popularity import order_by_popularity
+from recipes.search import search_recipes
+
+
+class IngredientFilter(FilterSet):
+    name = filters.CharFilter(lookup_expr='istartswith')
+
+    class Meta:
+        model = Ingredient
+        fields = ('name',)
 
 
 class RecipeFilter(FilterSet):
@@ -10,10 +20,15 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_by_shopping_cart',
     )
+    search = filters.CharFilter(method='filter_by_search')
+    ordering = filters.CharFilter(method='filter_by_ordering')
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author')
+        fields = (
+            'is_favorited', 'is_in_shopping_cart', 'author', 'search',
+            'ordering',
+        )
 
     def filter_by_favorite(self, recipes_queryset, name, value):
         return self._filter_by_user_relation(recipes_queryset, 'favorites', value)
@@ -21,6 +36,14 @@ class RecipeFilter(FilterSet):
     def filter_by_shopping_cart(self, recipes_queryset, name, value):
         return self._filter_by_user_relation(recipes_queryset, 'shopping_cart_items', value)
 
+    def filter_by_search(self, recipes_queryset, name, value):
+        return search_recipes(recipes_queryset, value)
+
+    def filter_by_ordering(self, recipes_queryset, name, value):
+        if value == 'popular':
+            return order_by_popularity(recipes_queryset)
+        return recipes_queryset
+
     def _filter_by_user_relation(self, recipes_queryset, related_name, value):
         if value and self.request.user.is_authenticated:
             return recipes_queryset.filter(
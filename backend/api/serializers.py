@@ -7,6 +7,9 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 
+from constants import MAX_AVAILABLE_INGREDIENTS, MAX_BULK_CHANGES
+from recipes.catalogue import get_catalogue
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (User, Subscriber, IngredientRecipe, Recipe,
                             Ingredient, Favorite, ShoppingCart)
 
@@ -56,6 +59,12 @@ class AvatarSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Avatar image is required.')
         return avatar_image
 
+    def update(self, instance, validated_data):
+        # Только аватар: остальные поля пользователя не перезаписываются.
+        instance.avatar = validated_data['avatar']
+        instance.save(update_fields=['avatar'])
+        return instance
+
 class IngredientInRecipeSerializer(serializers.Serializer):
     """Сериализатор ингредиентов при создании рецептов."""
 
@@ -87,29 +96,49 @@ class SaveRecipeSerializer(serializers.ModelSerializer):
         if len(ingredient_ids) != len(value):
             raise serializers.ValidationError('Ingredients must be unique.')
 
+        # Продукты, которых нет в каталоге процесса, могли быть добавлены
+        # другим воркером: их проверяем одним запросом к БД.
+        unknown = ingredient_ids - get_catalogue().keys()
+        if unknown:
+            unknown -= set(Ingredient.objects.filter(
+                id__in=unknown
+            ).values_list('id', flat=True))
+        if unknown:
+            raise serializers.ValidationError(
+                'Ingredients do not exist: '
+                f'{", ".join(map(str, sorted(unknown)))}.'
+            )
+
         return value
 
     def _update_ingredients(self, recipe, ingredients_data):
         """Обновление ингредиентов для данного рецепта"""
 
-        with transaction.atomic():
-            recipe.ingredients_in_recipe.all().delete()
-            IngredientRecipe.objects.bulk_create(
-                IngredientRecipe(
-                    recipe=recipe,
-                    ingredient_id=ingredient['ingredient']['id'],
-                    amount=ingredient['amount'])
-                for ingredient in ingredients_data
-            )
-
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient['ingredient']['id'],
+                amount=ingredient['amount'])
+            for ingredient in ingredients_data
+        )
+        ingredient_ids = [
+            ingredient['ingredient']['id'] for ingredient in ingredients_data
+        ]
+        transaction.on_commit(
+            lambda: ingredient_index.set_recipe(recipe.id, ingredient_ids)
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         recipe = super().create(validated_data)
         self._update_ingredients(recipe, ingredients_data)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients')
+        instance.ingredients_in_recipe.all().delete()
         self._update_ingredients(instance, ingredients_data)
         return super().update(instance, validated_data)
 
@@ -178,6 +207,61 @@ class RecipeBriefSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class RecipeCoverageSerializer(RecipeBriefSerializer):
+    """Краткий рецепт с долей имеющихся продуктов."""
+
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeBriefSerializer.Meta):
+        fields = RecipeBriefSerializer.Meta.fields + ('coverage', 'missing')
+        read_only_fields = fields
+
+
+class SimilarRecipeSerializer(RecipeBriefSerializer):
+    """Краткий рецепт со степенью сходства."""
+
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeBriefSerializer.Meta):
+        fields = RecipeBriefSerializer.Meta.fields + ('similarity',)
+        read_only_fields = fields
+
+
+class AvailableIngredientsSerializer(serializers.Serializer):
+    """Продукты, которые есть у пользователя."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=MAX_AVAILABLE_INGREDIENTS,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class BulkChangesSerializer(serializers.Serializer):
+    """id объектов для пакетного добавления и удаления."""
+
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False, default=list, max_length=MAX_BULK_CHANGES,
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False, default=list, max_length=MAX_BULK_CHANGES,
+    )
+
+    def validate(self, data):
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError(
+                'Nothing to add or remove.'
+            )
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError(
+                'The same id cannot be both added and removed.'
+            )
+        return data
+
+
 class UserSubscriptionSerializer(UserSerializer):
     """Сериализатор для пользователя с его рецептами и данными о подписке."""
 
@@ -195,7 +279,7 @@ class UserSubscriptionSerializer(UserSerializer):
     def get_recipes(self, obj):
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit') if request else None
-        recipes = obj.recipes.all()
+        recipes = obj.recipes.only(*RecipeBriefSerializer.Meta.fields)
 
         if limit and limit.isdigit():
             recipes = recipes[:int(limit)]
@@ -0,0 +1,158 @@
+"""
+Ограничение частоты запросов по скользящему окну.
+
+Счётчики живут в кэше THROTTLE_CACHE_ALIAS (с REDIS_URL - общий для
+всех воркеров, иначе у каждого процесса свой), в БД ничего не пишется.
+На каждое окно длиной в период лимита заводится ключ, который
+увеличивается атомарным incr; число запросов за последний период
+оценивается как счётчик текущего окна плюс счётчик предыдущего,
+взвешенный долей периода, которая ещё не прошла. Запрос стоит два
+обращения к кэшу.
+
+Async-представления (api/async_views.py) проверяют лимит сами и при
+переходе в DRF передают решение через request.throttle_decisions, чтобы
+запрос не был посчитан дважды.
+
+Отклонённые запросы пишутся в логгер 'throttling' на 1-м, 2-м, 4-м,
+8-м... отказе в окне - с числом отказов, без потока сообщений при
+атаке - и считаются метрикой throttled_requests.
+"""
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+from backend_foodgram.metrics import THROTTLED
+
+CACHE_KEY_PREFIX = 'throttle:'
+
+logger = logging.getLogger('throttling')
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """Лимит scope из DEFAULT_THROTTLE_RATES по скользящему окну."""
+
+    def __init__(self):
+        super().__init__()
+        self.cache = caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def applies(self, method, user):
+        return True
+
+    def get_cache_key(self, request, user):
+        if user is not None and user.is_authenticated:
+            ident = f'user:{user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'{CACHE_KEY_PREFIX}{self.scope}:{ident}'
+
+    def _window(self):
+        now = time.time()
+        window = int(now // self.duration)
+        return window, now / self.duration - window
+
+    def _check(self, key, elapsed, current, previous):
+        estimate = current + (previous or 0) * (1 - elapsed)
+        if estimate <= self.num_requests:
+            return True
+        rejected = math.ceil(estimate - self.num_requests)
+        THROTTLED.labels(self.scope).inc()
+        if rejected & (rejected - 1) == 0:
+            logger.warning(
+                'Лимит %s превышен: %s, отклонено запросов в окне: %d '
+                '(лимит %d за %d с)',
+                self.scope, key[len(CACHE_KEY_PREFIX):], rejected,
+                self.num_requests, self.duration,
+            )
+        return False
+
+    def allow_request(self, request, view):
+        if self.num_requests is None \
+                or not self.applies(request.method, request.user):
+            return True
+        decisions = getattr(request, 'throttle_decisions', {})
+        if self.scope in decisions:
+            return decisions[self.scope]
+        key = self.get_cache_key(request, request.user)
+        window, elapsed = self._window()
+        current_key = f'{key}:{window}'
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Ключа ещё нет; add не перезапишет ключ, созданный
+            # параллельным запросом.
+            if self.cache.add(current_key, 1, self.duration * 2):
+                current = 1
+            else:
+                current = self.cache.incr(current_key)
+        previous = self.cache.get(f'{key}:{window - 1}')
+        return self._check(key, elapsed, current, previous)
+
+    async def aallow_request(self, request, user):
+        """
+        allow_request для async-представлений (api/async_views.py):
+        user - результат их аутентификации (None для анонима).
+        """
+
+        if self.num_requests is None or not self.applies(request.method, user):
+            return True
+        key = self.get_cache_key(request, user)
+        window, elapsed = self._window()
+        current_key = f'{key}:{window}'
+        try:
+            current = await self.cache.aincr(current_key)
+        except ValueError:
+            if await self.cache.aadd(current_key, 1, self.duration * 2):
+                current = 1
+            else:
+                current = await self.cache.aincr(current_key)
+        previous = await self.cache.aget(f'{key}:{window - 1}')
+        allowed = self._check(key, elapsed, current, previous)
+        if not hasattr(request, 'throttle_decisions'):
+            request.throttle_decisions = {}
+        request.throttle_decisions[self.scope] = allowed
+        return allowed
+
+    def wait(self):
+        # Оценка начнёт снижаться не позже конца текущего окна.
+        _, elapsed = self._window()
+        return self.duration * (1 - elapsed)
+
+
+class AnonReadThrottle(SlidingWindowThrottle):
+    """Чтение анонимными клиентами (защита от парсеров)."""
+
+    scope = 'anon_read'
+
+    def applies(self, method, user):
+        return method in SAFE_METHODS \
+            and (user is None or not user.is_authenticated)
+
+
+class UserWriteThrottle(SlidingWindowThrottle):
+    """Изменяющие запросы авторизованных пользователей."""
+
+    scope = 'user_write'
+
+    def applies(self, method, user):
+        return method not in SAFE_METHODS \
+            and user is not None and user.is_authenticated
+
+
+class ImageUploadThrottle(SlidingWindowThrottle):
+    """Запросы с загрузкой изображений: рецепты и аватары."""
+
+    scope = 'image_upload'
+
+    def applies(self, method, user):
+        return method not in SAFE_METHODS
+
+
+class ShoppingListThrottle(SlidingWindowThrottle):
+    """Выгрузка списка покупок - тяжёлый агрегирующий запрос."""
+
+    scope = 'shopping_list'
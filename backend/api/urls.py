@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
 
 from .views import (
-    UsersViewSet, RecipesViewSet, IngredientsViewSet
+    UserAccountViewSet, UsersViewSet, RecipesViewSet, IngredientsViewSet
 )
 
+# Маршруты djoser (djoser.urls) с удалением аккаунта через recipes.deletion.
+account_router = routers.DefaultRouter()
+account_router.register('users', UserAccountViewSet)
+
 router = routers.SimpleRouter()
 router.register(r'users', UsersViewSet, basename='users')
 router.register(r'recipes', RecipesViewSet, basename='recipes')
@@ -13,7 +18,17 @@ router.register(r'ingredients', IngredientsViewSet, basename='ingredients')
 urlpatterns = [
     # Конечные точки аутентификации
     path('auth/', include('djoser.urls.authtoken')),
-    path('', include('djoser.urls')),
+    path('', include(account_router.urls)),
 ]
 
-urlpatterns += router.urls
\ No newline at end of file
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    # Async-чтение для ASGI; остальные методы уходят в те же ViewSet.
+    urlpatterns += [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('ingredients/', async_views.ingredient_list),
+    ]
+
+urlpatterns += router.urls
@@ -1,4 +1,5 @@
-from django.http import HttpResponse, FileResponse
+from django.http import Http404, HttpResponse, FileResponse
+from django.db import IntegrityError, transaction
 from django.db.models import Sum, Count
 from rest_framework.views import APIView
 from rest_framework.viewsets import ViewSet, ReadOnlyModelViewSet, ModelViewSet
@@ -6,26 +7,70 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.reverse import reverse
 from rest_framework import status, permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser.views import UserViewSet as DjoserUserViewSet
 
+from backend_foodgram.profiling import serializer_data
+from constants import FEED_MAX_LIMIT, PAGE_SIZE
 from recipes.models import (
     Ingredient, IngredientRecipe, Recipe,
-    Favorite, ShoppingCart, User, Subscriber
+    Favorite, ShoppingCart, User, Subscriber, SimilarRecipes
 )
-from .filters import RecipeFilter
+from recipes.bulk import apply_changes
+from recipes.deletion import delete_recipes, schedule_user_deletion
+from recipes.documents import render_recipes
+from recipes.feed import decode_cursor, encode_cursor, feed_page
+from recipes.ingredient_index import ingredient_index
+from recipes.short_links import encode
+from .filters import IngredientFilter, RecipeFilter
 from .permissions import IsOwnOrReadOnly
+from .throttling import ImageUploadThrottle, ShoppingListThrottle
 from .serializers import (
     AvatarSerializer, SaveRecipeSerializer, IngredientSerializer,
     RecipeReadSerializer, RecipeBriefSerializer,
-    UserSubscriptionSerializer
+    UserSubscriptionSerializer, AvailableIngredientsSerializer,
+    RecipeCoverageSerializer, SimilarRecipeSerializer, BulkChangesSerializer
 )
 from .pagination import DefaultPageNumberPagination
 
 import datetime
 
 
+def insert_link(model, **fields):
+    """
+    Вставляет связь без предварительных SELECT: True - создана,
+    False - уже была, None - объекта, на который она ссылается, нет.
+    Различать два последних случая приходится только при ошибке.
+    """
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**fields)
+    except IntegrityError:
+        if model.objects.filter(**fields).exists():
+            return False
+        return None
+    return True
+
+
+class UserAccountViewSet(DjoserUserViewSet):
+    """Пользователи djoser; аккаунт удаляется порциями в фоне."""
+
+    def perform_destroy(self, instance):
+        schedule_user_deletion([instance.pk])
+
+
 class UsersViewSet(ViewSet):
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        # Только загрузка: DELETE того же адреса - действие remove_avatar.
+        if self.action == 'change_avatar':
+            throttles.append(ImageUploadThrottle())
+        return throttles
+
     @action(methods=['put'], detail=False, permission_classes=[permissions.IsAuthenticated],
             url_path='me/avatar', url_name='avatar')
     def change_avatar(self, request):
@@ -35,7 +80,7 @@ class UsersViewSet(ViewSet):
 
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer_data(serializer), status=status.HTTP_200_OK)
 
     @change_avatar.mapping.delete
     def remove_avatar(self, request):
@@ -43,9 +88,9 @@ class UsersViewSet(ViewSet):
             return Response({'detail': 'No avatar to delete.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        request.user.avatar.delete(save=True)
+        request.user.avatar.delete(save=False)
         request.user.avatar = None
-        request.user.save()
+        request.user.save(update_fields=['avatar'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['get'], detail=False, permission_classes=[permissions.IsAuthenticated])
@@ -54,27 +99,31 @@ class UsersViewSet(ViewSet):
         paginator = DefaultPageNumberPagination()
         page = paginator.paginate_queryset(users, request)
         serializer = UserSubscriptionSerializer(page, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer_data(serializer), status=status.HTTP_200_OK)
 
     @action(methods=['post'], detail=True, permission_classes=[permissions.IsAuthenticated])
     def subscribe(self, request, pk=None):
-        user_to_subscribe = get_object_or_404(User, id=pk)
-
-        if request.user == user_to_subscribe:
-            raise serializers.ValidationError(
-                'Cannot subscribe to yourself.')
+        if str(request.user.pk) == pk:
+            raise ValidationError('Cannot subscribe to yourself.')
 
-        _, created = Subscriber.objects.get_or_create(
-            user=request.user,
-            subscribed_to=user_to_subscribe
+        created = insert_link(
+            Subscriber, user=request.user, subscribed_to_id=pk
+        )
+        if created is None:
+            raise Http404('No User matches the given query.')
+        user_to_subscribe = get_object_or_404(
+            User.objects.only(
+                'email', 'username', 'first_name', 'last_name', 'avatar'
+            ),
+            pk=pk
         )
         if not created:
-            raise serializers.ValidationError(
+            raise ValidationError(
                 f'Already subscribed to {user_to_subscribe.username}.'
             )
-        
-        serializer = UserSubscriptionSerializer(user_to_subscribe, context={"request": request})
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        serializer = UserSubscriptionSerializer(user_to_subscribe, context={'request': request})
+        return Response(serializer_data(serializer), status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def unsubscribe(self, request, pk=None):
@@ -87,6 +136,18 @@ class UsersViewSet(ViewSet):
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['post'], detail=False, permission_classes=[permissions.IsAuthenticated],
+            url_path='subscriptions/bulk', url_name='subscriptions-bulk')
+    def bulk_subscribe(self, request):
+        """Пакетные подписки: {"add": [id, ...], "remove": [id, ...]}."""
+
+        serializer = BulkChangesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': apply_changes(
+            Subscriber, request.user, 'subscribed_to', User.objects.all(),
+            exclude={request.user.id}, **serializer.validated_data
+        )})
+
 class RecipesViewSet(ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnOrReadOnly]
     filter_backends = [DjangoFilterBackend]
@@ -117,28 +178,62 @@ class RecipesViewSet(ModelViewSet):
             permission_classes = [IsOwnOrReadOnly]
         elif self.action == 'destroy':
             permission_classes = [IsOwnOrReadOnly]
+        elif self.action == 'what_can_i_cook':
+            permission_classes = [permissions.AllowAny]
+        elif self.action in ('feed', 'bulk_favorite', 'bulk_shopping_cart'):
+            permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAuthenticatedOrReadOnly]
         return [permission() for permission in permission_classes]
 
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        if self.action in ('create', 'update', 'partial_update'):
+            throttles.append(ImageUploadThrottle())
+        return throttles
+
     def get_queryset(self):
         """Возвращает оптимизированный QuerySet."""
 
         return Recipe.objects.all().select_related('author').prefetch_related('ingredients_in_recipe')
 
+    def list(self, request, *args, **kwargs):
+        """Страница рецептов из готовых документов (recipes/documents.py)."""
+
+        recipe_ids = self.paginate_queryset(self.filter_queryset(
+            Recipe.objects.all()
+        ).values_list('id', flat=True))
+        return self.get_paginated_response(
+            render_recipes(request, recipe_ids)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = str(kwargs['pk'])
+        results = render_recipes(request, [int(pk)]) if pk.isdigit() else None
+        if not results:
+            raise Http404('No Recipe matches the given query.')
+        return Response(results[0])
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        delete_recipes([instance.pk])
+
     def add_recipe_to_list(self, request, list_class, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        _, created = list_class.objects.get_or_create(user=request.user, recipe=recipe)
+        created = insert_link(list_class, user=request.user, recipe_id=pk)
+        if created is None:
+            raise Http404('No Recipe matches the given query.')
+        recipe = get_object_or_404(
+            Recipe.objects.only(*RecipeBriefSerializer.Meta.fields), pk=pk
+        )
         if not created:
-            raise serializers.ValidationError(
+            raise ValidationError(
                 f'Recipe "{recipe.name}" is already in {list_class._meta.verbose_name.title()}.'
             )
 
         serializer = RecipeBriefSerializer(recipe, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer_data(serializer), status=status.HTTP_201_CREATED)
 
     def delete_from_list(self, request, list_class, pk=None):
         deleted_count, _ = list_class.objects.filter(
@@ -148,15 +243,23 @@ class RecipesViewSet(ModelViewSet):
             return Response(status=status.HTTP_404_NOT_FOUND)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def change_list_in_bulk(self, request, list_class):
+        serializer = BulkChangesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': apply_changes(
+            list_class, request.user, 'recipe', Recipe.objects.all(),
+            **serializer.validated_data
+        )})
+
     @action(methods=['get'], detail=True, permission_classes=[permissions.AllowAny],
             url_path='get-link', url_name='get-link')
     def get_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
         return Response(
             {
                 'short-link': request.build_absolute_uri
                 (
-                    reverse('resolve-short-link', args=[recipe.id])
+                    reverse('resolve-short-link', args=[encode(recipe.id)])
                 )
             }, 
             status=status.HTTP_200_OK
@@ -180,7 +283,99 @@ class RecipesViewSet(ModelViewSet):
     def remove_shopping_cart(self, request, pk=None):
         return self.delete_from_list(request, ShoppingCart, pk)
 
+    @action(methods=['post'], detail=False, permission_classes=[permissions.IsAuthenticated],
+            url_path='favorite/bulk', url_name='favorite-bulk')
+    def bulk_favorite(self, request):
+        """Пакетное изменение избранного: {"add": [...], "remove": [...]}."""
+
+        return self.change_list_in_bulk(request, Favorite)
+
+    @action(methods=['post'], detail=False, permission_classes=[permissions.IsAuthenticated],
+            url_path='shopping_cart/bulk', url_name='shopping_cart-bulk')
+    def bulk_shopping_cart(self, request):
+        """Пакетное изменение списка покупок."""
+
+        return self.change_list_in_bulk(request, ShoppingCart)
+
+    @action(methods=['get'], detail=True, permission_classes=[permissions.AllowAny])
+    def similar(self, request, pk=None):
+        """Рецепты с похожим набором продуктов (см. build_similarity)."""
+
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        neighbours = SimilarRecipes.objects.filter(
+            recipe=recipe
+        ).values_list('neighbours', flat=True).first() or []
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _ in neighbours]
+        )
+        results = []
+        for recipe_id, similarity in neighbours:
+            if recipe_id in recipes:
+                recipes[recipe_id].similarity = similarity
+                results.append(recipes[recipe_id])
+        return Response(serializer_data(SimilarRecipeSerializer(
+            results, many=True, context={'request': request}
+        )))
+
     @action(methods=['get'], detail=False, permission_classes=[permissions.IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок, по курсору от новых к старым."""
+
+        limit = request.query_params.get('limit', '')
+        limit = min(int(limit), FEED_MAX_LIMIT) \
+            if limit.isdigit() and int(limit) else PAGE_SIZE
+        after = None
+        if request.query_params.get('cursor'):
+            try:
+                after = decode_cursor(request.query_params['cursor'])
+            except ValueError as error:
+                raise ValidationError({'cursor': str(error)})
+        author_ids = list(Subscriber.objects.filter(
+            user=request.user
+        ).values_list('subscribed_to_id', flat=True))
+        keys, has_next = feed_page(author_ids, limit, after)
+        next_url = replace_query_param(
+            request.build_absolute_uri(), 'cursor', encode_cursor(keys[-1])
+        ) if has_next else None
+        return Response({
+            'next': next_url,
+            'results': render_recipes(request, [key[1] for key in keys]),
+        })
+
+    @action(methods=['post'], detail=False, permission_classes=[permissions.AllowAny],
+            url_path='what-can-i-cook', url_name='what-can-i-cook')
+    def what_can_i_cook(self, request):
+        """Рецепты по имеющимся продуктам, лучшие по покрытию - первыми."""
+
+        serializer = AvailableIngredientsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids, coverage, missing = ingredient_index.match(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data.get('max_missing'),
+        )
+        paginator = DefaultPageNumberPagination()
+        page = paginator.paginate_queryset(
+            range(len(recipe_ids)), request, view=self
+        )
+        recipes = Recipe.objects.in_bulk(
+            [int(recipe_ids[position]) for position in page]
+        )
+        results = []
+        for position in page:
+            recipe = recipes.get(int(recipe_ids[position]))
+            if recipe is None:
+                continue
+            recipe.coverage = round(float(coverage[position]), 4)
+            recipe.missing = int(missing[position])
+            results.append(recipe)
+        return paginator.get_paginated_response(serializer_data(
+            RecipeCoverageSerializer(
+                results, many=True, context={'request': request}
+            )
+        ))
+
+    @action(methods=['get'], detail=False, permission_classes=[permissions.IsAuthenticated],
+            throttle_classes=[ShoppingListThrottle])
     def download_shopping_cart(self, request):
         ingredients = IngredientRecipe.objects.filter(
             recipe__shopping_cart_items__user=request.user
@@ -223,3 +418,11 @@ class IngredientsViewSet(ReadOnlyModelViewSet):
     permission_classes = [permissions.AllowAny]
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(
+            self.filter_queryset(self.get_queryset()), many=True
+        )
+        return Response(serializer_data(serializer))
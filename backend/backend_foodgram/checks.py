@@ -0,0 +1,71 @@
+"""
+Проверки настроек кэшей, которые должны быть общими для воркеров.
+
+LocMemCache живёт в памяти процесса: под gunicorn с несколькими
+воркерами каждый видит только свои записи. Для данных, которые один
+воркер пишет, а другой должен прочитать, нужен общий кэш (REDIS_URL).
+Проверки выполняются командами manage.py и при запуске gunicorn
+(gunicorn.conf.py).
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Настройка с алиасом кэша, что сломается без общего кэша, условие
+# проверки (с DEBUG обычно работает один процесс runserver) и id.
+SHARED_CACHES = (
+    (
+        'REPLICA_PIN_CACHE_ALIAS',
+        'после записи пользователь может читать устаревшие данные с '
+        'реплики, если следующий запрос попал в другой воркер',
+        lambda: bool(settings.REPLICA_DATABASES),
+        'backend_foodgram.W001',
+    ),
+    (
+        'FEED_CACHE_ALIAS',
+        'после публикации рецепта другие воркеры отдают ленту без него '
+        'до FEED_CACHE_TTL',
+        lambda: not settings.DEBUG,
+        'backend_foodgram.W002',
+    ),
+    (
+        'THROTTLE_CACHE_ALIAS',
+        'у каждого воркера свои счётчики, и фактический лимит в число '
+        'воркеров раз выше заданного',
+        lambda: not settings.DEBUG and any(
+            settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].values()
+        ),
+        'backend_foodgram.W003',
+    ),
+    (
+        'TOKEN_AUTH_CACHE_ALIAS',
+        'после выхода удалённый токен принимается другими воркерами '
+        'до TOKEN_AUTH_CACHE_TTL',
+        lambda: not settings.DEBUG and settings.TOKEN_AUTH_CACHE_TTL > 0,
+        'backend_foodgram.W004',
+    ),
+)
+
+
+def is_process_local(alias):
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    return backend is None or backend in PROCESS_LOCAL_BACKENDS
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    return [
+        Warning(
+            f'{setting}={getattr(settings, setting)!r} указывает на кэш '
+            f'в памяти процесса: {problem}.',
+            hint='Задайте REDIS_URL (или алиас общего кэша в '
+                 f'{setting}).',
+            id=check_id,
+        )
+        for setting, problem, enabled, check_id in SHARED_CACHES
+        if enabled() and is_process_local(getattr(settings, setting))
+    ]
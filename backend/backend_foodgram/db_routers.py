@@ -0,0 +1,115 @@
+import hashlib
+from contextvars import ContextVar
+from itertools import cycle
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_DB = 'default'
+PIN_CACHE_PREFIX = 'replica_pin:'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Аутентификация читает с основной БД: только что выданный токен
+# может ещё не дойти до реплики.
+PRIMARY_ONLY_APPS = ('authtoken',)
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+def _pin_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    digest = hashlib.sha256(authorization.encode()).hexdigest()
+    return PIN_CACHE_PREFIX + digest
+
+
+class ReplicaMiddleware:
+    """
+    Разрешает чтение с реплик для безопасных запросов и закрепляет
+    пользователя за основной БД на REPLICA_PIN_SECONDS после записи,
+    чтобы он сразу видел свои изменения. Закрепления хранятся в кэше
+    REPLICA_PIN_CACHE_ALIAS, общем для воркеров. Работает и в sync, и в async
+    цепочке без лишних переходов между потоками.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pin_key = _pin_key(request)
+        pinned = bool(pin_key) and self._enabled(request) \
+            and self._cache().get(pin_key)
+        token = use_replica.set(self._use_replica(request, pinned))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if self._should_pin(request, pin_key, response):
+            self._cache().set(pin_key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        pin_key = _pin_key(request)
+        pinned = bool(pin_key) and self._enabled(request) \
+            and await self._cache().aget(pin_key)
+        token = use_replica.set(self._use_replica(request, pinned))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if self._should_pin(request, pin_key, response):
+            await self._cache().aset(
+                pin_key, True, settings.REPLICA_PIN_SECONDS
+            )
+        return response
+
+    @staticmethod
+    def _cache():
+        return caches[settings.REPLICA_PIN_CACHE_ALIAS]
+
+    @staticmethod
+    def _enabled(request):
+        return bool(settings.REPLICA_DATABASES) \
+            and request.method in SAFE_METHODS
+
+    def _use_replica(self, request, pinned):
+        return self._enabled(request) and not pinned
+
+    @staticmethod
+    def _should_pin(request, pin_key, response):
+        return (bool(settings.REPLICA_DATABASES) and bool(pin_key)
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400)
+
+
+class ReplicaRouter:
+    """
+    Отправляет чтение внутри безопасных запросов на реплики по кругу,
+    всё остальное, включая запись и команды manage.py, на основную БД.
+    """
+
+    def __init__(self):
+        self.replicas = cycle(settings.REPLICA_DATABASES)
+
+    def db_for_read(self, model, **hints):
+        if (not settings.REPLICA_DATABASES or not use_replica.get()
+                or model._meta.app_label in PRIMARY_ONLY_APPS):
+            return DEFAULT_DB
+        return next(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB
@@ -0,0 +1,153 @@
+"""
+Метрики в формате Prometheus.
+
+Под gunicorn каждый воркер пишет значения в mmap-файлы каталога
+PROMETHEUS_MULTIPROC_DIR (задаётся в gunicorn.conf.py), а /metrics
+собирает их со всех воркеров. Без этой переменной метрики хранятся
+в памяти процесса (runserver, manage.py).
+"""
+import hmac
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Длительность HTTP-запроса',
+    ['method', 'route'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter(
+    'http_requests', 'Количество HTTP-запросов',
+    ['method', 'route', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Количество SQL-запросов за HTTP-запрос',
+    ['route'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests', 'Обращения к кэшам приложения', ['cache', 'result'],
+)
+THROTTLED = Counter(
+    'throttled_requests', 'Запросы, отклонённые лимитами частоты', ['scope'],
+)
+DB_POOL = Gauge(
+    'db_pool_connections', 'Состояние пула соединений psycopg',
+    ['alias', 'state'], multiprocess_mode='livesum',
+)
+POOL_STATES = ('pool_size', 'pool_available', 'requests_waiting')
+
+query_count = ContextVar('query_count', default=None)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def request_route(request):
+    """Имя маршрута запроса, а не путь: иначе каждый id даст новую серию."""
+
+    match = request.resolver_match
+    return match.view_name if match and match.view_name else (
+        match.route if match else 'unmatched'
+    )
+
+
+def _count_queries(execute, sql, params, many, context):
+    counter = query_count.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+def _update_pool_stats():
+    for connection in connections.all(initialized_only=True):
+        pool = getattr(connection, 'pool', None)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        for state in POOL_STATES:
+            DB_POOL.labels(connection.alias, state).set(stats.get(state, 0))
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(install_query_counter)
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started, counter = time.perf_counter(), [0]
+        token = query_count.set(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            query_count.reset(token)
+        self._observe(request, response, started, counter[0])
+        return response
+
+    async def __acall__(self, request):
+        started, counter = time.perf_counter(), [0]
+        token = query_count.set(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_count.reset(token)
+        self._observe(request, response, started, counter[0])
+        return response
+
+    @staticmethod
+    def _observe(request, response, started, queries):
+        route = request_route(request)
+        if route == 'metrics':
+            return
+        REQUEST_LATENCY.labels(request.method, route).observe(
+            time.perf_counter() - started
+        )
+        REQUESTS.labels(request.method, route, response.status_code).inc()
+        REQUEST_QUERIES.labels(route).observe(queries)
+        if settings.DATABASES['default'].get('OPTIONS', {}).get('pool'):
+            _update_pool_stats()
+
+
+def _allowed(request):
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        provided = request.headers.get('Authorization', '')
+        if hmac.compare_digest(provided, expected):
+            return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,225 @@
+"""
+Профилирование отдельных запросов.
+
+Запрос профилируется, если в нём передан заголовок X-Profile со
+значением PROFILING_TOKEN или он попал в выборку PROFILING_SAMPLE_RATE.
+Время раскладывается на непересекающиеся фазы (собственное время каждой):
+middleware, auth, view (код представления), serialize (сериализаторы
+и сборка рецептов из документов), db и render.
+Итог возвращается в заголовке Server-Timing, а при заданном
+PROFILING_DIR профиль cProfile сохраняется в файл для pstats/snakeviz.
+"""
+import cProfile
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('profiling')
+
+current_profile = ContextVar('current_profile', default=None)
+
+PHASES = ('middleware', 'auth', 'view', 'serialize', 'db', 'render')
+SLUG_PATTERN = re.compile(r'[^\w]+')
+
+
+class RequestProfile:
+    """Собственное время фаз запроса и статистика SQL."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.stack = [('middleware', self.started)]
+        self.queries = Counter()
+
+    def enter(self, phase):
+        now = time.perf_counter()
+        parent, since = self.stack[-1]
+        self.durations[parent] += now - since
+        self.stack.append((phase, now))
+
+    def exit(self, phase):
+        if len(self.stack) < 2 or self.stack[-1][0] != phase:
+            return
+        now = time.perf_counter()
+        _, since = self.stack.pop()
+        self.durations[phase] += now - since
+        parent, _ = self.stack[-1]
+        self.stack[-1] = (parent, now)
+
+    def finish(self):
+        while len(self.stack) > 1:
+            self.exit(self.stack[-1][0])
+        phase, since = self.stack[0]
+        now = time.perf_counter()
+        self.durations[phase] += now - since
+        self.total = now - self.started
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.queries.values() if count > 1)
+
+    def server_timing(self):
+        metrics = [f'total;dur={self.total * 1000:.2f}']
+        for phase in PHASES:
+            metric = f'{phase};dur={self.durations[phase] * 1000:.2f}'
+            if phase == 'db':
+                metric += (f';desc="{self.query_count} queries, '
+                           f'{self.duplicate_count} duplicates"')
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+
+@contextmanager
+def profile_phase(phase):
+    """Относит время блока к фазе, если запрос профилируется."""
+
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    profile.enter(phase)
+    try:
+        yield
+    finally:
+        profile.exit(phase)
+
+
+def serializer_data(serializer):
+    """serializer.data с учётом времени в фазе serialize."""
+
+    with profile_phase('serialize'):
+        return serializer.data
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    profile.queries[(sql, str(params))] += 1
+    with profile_phase('db'):
+        return execute(sql, params, many, context)
+
+
+def install_query_wrapper(connection, **kwargs):
+    """
+    Подключает учёт запросов к соединению. Соединения привязаны к потокам,
+    а async ORM выполняет запросы в отдельном потоке, поэтому обёртка
+    ставится на каждое соединение и ничего не делает вне профилирования.
+    """
+
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not (settings.PROFILING_TOKEN or settings.PROFILING_SAMPLE_RATE):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.dump_dir = (
+            Path(settings.PROFILING_DIR) if settings.PROFILING_DIR else None
+        )
+        if self.dump_dir is not None:
+            self.dump_dir.mkdir(parents=True, exist_ok=True)
+        connection_created.connect(install_query_wrapper)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _should_profile(self, request):
+        header = request.headers.get('X-Profile')
+        if settings.PROFILING_TOKEN and header == settings.PROFILING_TOKEN:
+            return True
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._should_profile(request):
+            return self.get_response(request)
+        profile, profiler, token = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(profiler, token)
+        return self._finish(request, response, profile, profiler)
+
+    async def __acall__(self, request):
+        if not self._should_profile(request):
+            return await self.get_response(request)
+        profile, profiler, token = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(profiler, token)
+        return self._finish(request, response, profile, profiler)
+
+    def _start(self):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+        profiler = None
+        if self.dump_dir is not None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # В процессе уже работает другой профилировщик.
+                profiler = None
+        return profile, profiler, token
+
+    @staticmethod
+    def _stop(profiler, token):
+        if profiler is not None:
+            profiler.disable()
+        current_profile.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.enter('view')
+
+    def process_template_response(self, request, response):
+        """Ответы DRF рендерятся после этого хука: отмечаем начало render."""
+
+        profile = current_profile.get()
+        if profile is not None:
+            profile.exit('view')
+            profile.enter('render')
+            response.add_post_render_callback(
+                lambda rendered: profile.exit('render')
+            )
+        return response
+
+    def _finish(self, request, response, profile, profiler):
+        profile.finish()
+        response['Server-Timing'] = profile.server_timing()
+        logger.info(
+            '%s %s %s: %s', request.method, request.get_full_path(),
+            response.status_code, response['Server-Timing']
+        )
+        if profiler is not None:
+            slug = SLUG_PATTERN.sub('_', request.path).strip('_') or 'root'
+            profiler.dump_stats(self.dump_dir / (
+                f'{time.strftime("%Y%m%d-%H%M%S")}-{time.time_ns() % 10**9}'
+                f'-{request.method}-{slug}.prof'
+            ))
+        return response
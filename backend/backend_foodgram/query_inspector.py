@@ -0,0 +1,172 @@
+"""
+Поиск медленных запросов и N+1.
+
+Каждый SQL-запрос замеряется; запросы дольше SLOW_QUERY_MS логируются
+сразу. Внутри HTTP-запроса считаются повторения одинаковых по форме
+запросов (без учёта параметров): форма, повторившаяся
+N_PLUS_ONE_THRESHOLD раз и больше, логируется в конце запроса вместе
+с представлением и строкой кода проекта, из которой она вызвана.
+Записи пишутся в логгер query_inspector в виде JSON.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('query_inspector')
+
+current_inspection = ContextVar('current_inspection', default=None)
+
+IN_LIST_PATTERN = re.compile(r'IN \((?:%s, )*%s\)')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+PROJECT_DIR = str(Path(settings.BASE_DIR))
+# Middleware и роутеры проекта есть в каждом стеке, их не показываем.
+INFRASTRUCTURE_DIR = str(Path(__file__).resolve().parent)
+LIBRARY_PATHS = ('site-packages', 'dist-packages')
+ORM_PATH = str(Path('django', 'db'))
+
+
+def query_shape(sql):
+    """Шаблон запроса: IN-списки любой длины считаются одинаковыми."""
+
+    return IN_LIST_PATTERN.sub('IN (...)', WHITESPACE_PATTERN.sub(' ', sql))
+
+
+def _format_frame(frame):
+    filename = frame.f_code.co_filename
+    if filename.startswith(PROJECT_DIR):
+        filename = str(Path(filename).relative_to(PROJECT_DIR))
+    return f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+
+
+def calling_frame():
+    """
+    Ближайшая к запросу строка кода приложений проекта (не manage.py
+    и не middleware), а если её нет
+    (запрос сделан из DRF при сериализации) - ближайшая строка вне ORM.
+    """
+
+    fallback = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_DIR + os.sep) \
+                and os.sep in filename[len(PROJECT_DIR) + 1:] \
+                and not filename.startswith(INFRASTRUCTURE_DIR) \
+                and not any(path in filename for path in LIBRARY_PATHS):
+            return _format_frame(frame)
+        if fallback is None and ORM_PATH not in filename \
+                and not filename.startswith(INFRASTRUCTURE_DIR):
+            fallback = frame
+        frame = frame.f_back
+    return _format_frame(fallback) if fallback is not None else None
+
+
+def log_event(event, **fields):
+    logger.warning(json.dumps(
+        {'event': event, **fields}, ensure_ascii=False, default=str
+    ))
+
+
+class Inspection:
+    """Формы запросов одного HTTP-запроса."""
+
+    def __init__(self, path):
+        self.path = path
+        self.view = None
+        self.shapes = {}
+
+    def record(self, sql):
+        shape = query_shape(sql)
+        count, frame = self.shapes.get(shape, (0, None))
+        count += 1
+        if count == settings.N_PLUS_ONE_THRESHOLD:
+            frame = calling_frame()
+        self.shapes[shape] = (count, frame)
+
+    def report(self):
+        for shape, (count, frame) in self.shapes.items():
+            if count >= settings.N_PLUS_ONE_THRESHOLD:
+                log_event(
+                    'n_plus_one', view=self.view, path=self.path,
+                    query=shape, count=count, frame=frame,
+                )
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = (time.perf_counter() - started) * 1000
+        inspection = current_inspection.get()
+        if inspection is not None:
+            inspection.record(sql)
+        if duration >= settings.SLOW_QUERY_MS:
+            log_event(
+                'slow_query',
+                view=inspection.view if inspection else None,
+                path=inspection.path if inspection else None,
+                query=query_shape(sql), duration_ms=round(duration, 2),
+                alias=context['connection'].alias, frame=calling_frame(),
+            )
+
+
+def install_query_wrapper(connection, **kwargs):
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+class QueryInspectorMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Медленные запросы ловятся и вне HTTP (команды, воркеры).
+        connection_created.connect(install_query_wrapper)
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inspection = Inspection(request.path)
+        token = current_inspection.set(inspection)
+        try:
+            return self.get_response(request)
+        finally:
+            current_inspection.reset(token)
+            inspection.report()
+
+    async def __acall__(self, request):
+        inspection = Inspection(request.path)
+        token = current_inspection.set(inspection)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_inspection.reset(token)
+            inspection.report()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        inspection = current_inspection.get()
+        if inspection is not None:
+            match = request.resolver_match
+            inspection.view = (
+                match.view_name if match and match.view_name
+                else getattr(view_func, '__qualname__', repr(view_func))
+            )
@@ -1,6 +1,8 @@
+import importlib.util
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 
@@ -43,7 +45,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend_foodgram.metrics.MetricsMiddleware',
+    'backend_foodgram.traffic.TrafficRecorderMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'backend_foodgram.query_inspector.QueryInspectorMiddleware',
+    'backend_foodgram.profiling.ProfilingMiddleware',
+    'backend_foodgram.db_routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,11 +79,14 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend_foodgram.wsgi.application'
 
+# Async-представления чтения (api/async_views.py); включать при запуске под ASGI.
+ASYNC_READ_VIEWS = int(os.getenv('ASYNC_READ_VIEWS', 0))
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-if TYPE_DB == "postgres":
+if TYPE_DB == 'postgres':
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.postgresql',
@@ -84,9 +94,28 @@ if TYPE_DB == "postgres":
             'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'foodgram_password'),
             'HOST': os.getenv('POSTGRES_DB_HOST', '0.0.0.0'),
-            'PORT': os.getenv('POSTGRES_DB_PORT', 5432)
+            'PORT': os.getenv('POSTGRES_DB_PORT', 5432),
+            'CONN_MAX_AGE': int(os.getenv('POSTGRES_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': bool(int(os.getenv('POSTGRES_CONN_HEALTH_CHECKS', 1))),
         }
     }
+    # Пул соединений psycopg3 (требует пакет psycopg[pool], которого нет
+    # в requirements.txt: по умолчанию используется psycopg2).
+    # Пул несовместим с постоянными соединениями, поэтому CONN_MAX_AGE = 0.
+    if int(os.getenv('POSTGRES_POOL', 0)):
+        if importlib.util.find_spec('psycopg_pool') is None:
+            raise ImproperlyConfigured(
+                'POSTGRES_POOL=1 требует пакет psycopg[pool]: '
+                'pip install "psycopg[binary,pool]"'
+            )
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.getenv('POSTGRES_POOL_TIMEOUT', 10)),
+            }
+        }
 else:
     DATABASES = {
         'default': {
@@ -95,6 +124,48 @@ else:
         }
     }
 
+# Реплики только для чтения: POSTGRES_REPLICA_HOSTS="host1:5432,host2",
+# для локальной проверки на SQLite - SQLITE_REPLICA_FILES="r1.sqlite3,r2.sqlite3".
+if TYPE_DB == 'postgres':
+    for index, replica in enumerate(filter(None, os.getenv('POSTGRES_REPLICA_HOSTS', '').split(',')), start=1):
+        host, _, port = replica.strip().partition(':')
+        DATABASES[f'replica_{index}'] = {
+            **DATABASES['default'],
+            'HOST': host,
+            'PORT': port or DATABASES['default']['PORT'],
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    for index, replica in enumerate(filter(None, os.getenv('SQLITE_REPLICA_FILES', '').split(',')), start=1):
+        DATABASES[f'replica_{index}'] = {
+            **DATABASES['default'],
+            'NAME': os.path.join(BASE_DIR, replica.strip()),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+# Закрепления за основной БД должны быть видны всем воркерам: алиас
+# общего кэша (см. backend_foodgram/checks.py).
+REPLICA_PIN_CACHE_ALIAS = os.getenv('REPLICA_PIN_CACHE_ALIAS', 'default')
+DATABASE_ROUTERS = ['backend_foodgram.db_routers.ReplicaRouter']
+
+
+# Общий кэш воркеров: REDIS_URL=redis://redis:6379/0, иначе кэш в памяти процесса.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 LOGGING = {
     'version': 1,
@@ -104,23 +175,72 @@ LOGGING = {
             'format': '{asctime} {levelname} {name}: {message}',
             'style': '{',
         },
+        'json': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
             'formatter': 'standard',
-        }
+        },
+        'json_console': {
+            'level': 'DEBUG',
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
     },
     'loggers': {
-        'django.db.backends': {
+        'query_inspector': {
+            'handlers': ['json_console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'profiling': {
             'handlers': ['console'],
             'level': 'INFO',
-        }
+        },
+        'throttling': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     }
 }
 
 
+# Поиск медленных запросов и N+1 (backend_foodgram/query_inspector.py).
+QUERY_INSPECTOR_ENABLED = int(os.getenv('QUERY_INSPECTOR_ENABLED', 1))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+
+# Профилирование запросов (backend_foodgram/profiling.py): заголовок
+# X-Profile: <PROFILING_TOKEN> или случайная доля PROFILING_SAMPLE_RATE.
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIR = os.getenv('PROFILING_DIR', '')
+
+# Запись трафика для replay_traffic (backend_foodgram/traffic.py):
+# пустой TRAFFIC_LOG_PATH отключает запись.
+TRAFFIC_LOG_PATH = os.getenv('TRAFFIC_LOG_PATH', '')
+TRAFFIC_SAMPLE_RATE = float(os.getenv('TRAFFIC_SAMPLE_RATE', 1))
+TRAFFIC_PATH_PREFIXES = [
+    prefix.strip() for prefix in
+    os.getenv('TRAFFIC_PATH_PREFIXES', '/api/,/link/').split(',')
+    if prefix.strip()
+]
+
+# Метрики Prometheus (backend_foodgram/metrics.py): /metrics доступен
+# с адресов METRICS_ALLOWED_IPS или с заголовком Authorization: Bearer.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in
+    os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',') if ip.strip()
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -169,10 +289,40 @@ AUTH_USER_MODEL = 'recipes.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ]
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.AnonReadThrottle',
+        'api.throttling.UserWriteThrottle',
+    ],
+    # Лимиты вида '120/min'; пустое значение переменной отключает лимит.
+    'DEFAULT_THROTTLE_RATES': {
+        scope: os.getenv(f'THROTTLE_{scope.upper()}', rate) or None
+        for scope, rate in (
+            ('anon_read', '120/min'),
+            ('user_write', '60/min'),
+            ('image_upload', '30/hour'),
+            ('shopping_list', '10/min'),
+        )
+    },
+    # Число прокси (nginx) перед приложением: адрес клиента для лимитов
+    # берётся из X-Forwarded-For.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
+# Кэш последних рецептов авторов для ленты (recipes/feed.py).
+FEED_CACHE_ALIAS = os.getenv('FEED_CACHE_ALIAS', 'default')
+
+# Кэш счётчиков лимитов (api/throttling.py).
+THROTTLE_CACHE_ALIAS = os.getenv('THROTTLE_CACHE_ALIAS', 'default')
+
+# Кэш токен -> id пользователя (api/authentication.py). TTL 0 отключает кэш;
+# TOKEN_AUTH_CACHE_ALIAS - алиас общего кэша воркеров из CACHES или
+# local для LRU в памяти процесса (размер TOKEN_AUTH_CACHE_SIZE).
+TOKEN_AUTH_CACHE_TTL = int(os.getenv('TOKEN_AUTH_CACHE_TTL', 30))
+TOKEN_AUTH_CACHE_SIZE = int(os.getenv('TOKEN_AUTH_CACHE_SIZE', 10000))
+TOKEN_AUTH_CACHE_ALIAS = os.getenv('TOKEN_AUTH_CACHE_ALIAS', 'default')
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
@@ -0,0 +1,96 @@
+"""
+Запись реального трафика API для воспроизведения командой replay_traffic.
+
+Включается переменной TRAFFIC_LOG_PATH: в этот файл на каждый запрос
+к путям TRAFFIC_PATH_PREFIXES (или на долю TRAFFIC_SAMPLE_RATE из них)
+дописывается строка JSON с временем начала, методом, путём, строкой
+запроса, id пользователя, маршрутом, статусом и длительностью. Тела
+запросов и заголовки (в том числе токены) не пишутся.
+
+Строка пишется одним системным вызовом в файл, открытый на дозапись,
+поэтому воркеры gunicorn могут писать в один файл, не перемешивая строк.
+"""
+import json
+import logging
+import os
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import LazyObject, empty
+
+from .metrics import request_route
+
+logger = logging.getLogger(__name__)
+
+
+def recorded_user_id(request):
+    """
+    id пользователя, если запрос уже аутентифицирован (DRF и async-
+    представления подменяют request.user). Ленивый request.user из
+    сессии не вычисляется: в async-контексте это запрос к БД.
+    """
+
+    user = request.__dict__.get('user')
+    if isinstance(user, LazyObject):
+        user = None if user._wrapped is empty else user._wrapped
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+class TrafficRecorderMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_LOG_PATH:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.fd = os.open(
+            settings.TRAFFIC_LOG_PATH,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640,
+        )
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _should_record(self, request):
+        return request.path.startswith(
+            tuple(settings.TRAFFIC_PATH_PREFIXES)
+        ) and random.random() < settings.TRAFFIC_SAMPLE_RATE
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._should_record(request):
+            return self.get_response(request)
+        timestamp, started = time.time(), time.perf_counter()
+        response = self.get_response(request)
+        self._write(request, response, timestamp, started)
+        return response
+
+    async def __acall__(self, request):
+        if not self._should_record(request):
+            return await self.get_response(request)
+        timestamp, started = time.time(), time.perf_counter()
+        response = await self.get_response(request)
+        self._write(request, response, timestamp, started)
+        return response
+
+    def _write(self, request, response, timestamp, started):
+        line = json.dumps({
+            'ts': round(timestamp, 6),
+            'method': request.method,
+            'path': request.path,
+            'query': request.META.get('QUERY_STRING', ''),
+            'user': recorded_user_id(request),
+            'route': request_route(request),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+        }, ensure_ascii=False)
+        try:
+            os.write(self.fd, (line + '\n').encode())
+        except OSError:
+            logger.exception('Не удалось записать запрос в журнал трафика')
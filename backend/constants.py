@@ -1 +1,39 @@
 PAGE_SIZE = 6
+
+IMPORT_CHUNK_SIZE = 5000
+
+RECIPES_BATCH_SIZE = 1000
+
+INGREDIENT_CATALOGUE_TTL = 300
+
+SHORT_LINK_BITMAP_TTL = 300
+
+SHORT_LINK_CLICKS_FLUSH_SECONDS = 30
+
+RECIPE_INDEX_REFRESH = 30
+
+RECIPE_INDEX_TTL = 3600
+
+RECIPE_INDEX_REBUILD_THRESHOLD = 1000
+
+MAX_AVAILABLE_INGREDIENTS = 100
+
+FEED_AUTHOR_RECENT = 50
+
+FEED_CACHE_TTL = 600
+
+FEED_MAX_LIMIT = 100
+
+MAX_BULK_CHANGES = 500
+
+DELETE_CHUNK_SIZE = 5000
+
+POPULARITY_HALF_LIFE_DAYS = 7
+
+POPULARITY_FAVORITE_WEIGHT = 1.0
+
+POPULARITY_CART_WEIGHT = 2.0
+
+SIMILAR_RECIPES_COUNT = 20
+
+SIMILARITY_BATCH_SIZE = 256
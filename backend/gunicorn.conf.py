@@ -0,0 +1,130 @@
+"""
+Конфигурация gunicorn, читается автоматически из рабочего каталога.
+
+Все параметры задаются переменными окружения GUNICORN_*:
+GUNICORN_WORKER_CLASS - gthread (по умолчанию), sync или asgi
+(UvicornWorker, приложение backend_foodgram.asgi, см. ASYNC_READ_VIEWS).
+Метрики воркеров складываются в PROMETHEUS_MULTIPROC_DIR.
+"""
+import multiprocessing
+import os
+import shutil
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'asgi': 'uvicorn_worker.UvicornWorker',
+}
+
+cpu_count = multiprocessing.cpu_count()
+worker_type = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_type not in WORKER_CLASSES:
+    raise RuntimeError(
+        'GUNICORN_WORKER_CLASS должен быть одним из: '
+        f'{", ".join(WORKER_CLASSES)}'
+    )
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = WORKER_CLASSES[worker_type]
+wsgi_app = (
+    'backend_foodgram.asgi:application' if worker_type == 'asgi'
+    else 'backend_foodgram.wsgi:application'
+)
+# Потоки gthread ждут БД и диск, поэтому процессов нужно меньше,
+# чем для sync; async-воркеру хватает одного процесса на ядро.
+default_workers = {
+    'sync': cpu_count * 2 + 1,
+    'gthread': cpu_count + 1,
+    'asgi': cpu_count,
+}[worker_type]
+workers = int(os.getenv('GUNICORN_WORKERS', default_workers))
+threads = int(os.getenv(
+    'GUNICORN_THREADS', 4 if worker_type == 'gthread' else 1
+))
+
+# Приложение загружается в мастер-процессе до fork: код и прогретые
+# кэши делятся между воркерами через copy-on-write.
+preload_app = bool(int(os.getenv('GUNICORN_PRELOAD', 1)))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+# Должно быть задано до импорта prometheus_client приложением.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', '/tmp/foodgram-metrics'
+)
+# Файлы прошлого запуска исказили бы счётчики. Каталог очищается при
+# чтении конфигурации, то есть до загрузки приложения (preload_app
+# импортирует его раньше хука on_starting), и только при первом чтении:
+# по HUP конфигурация перечитывается, а работающие воркеры ещё пишут.
+if not os.environ.get('FOODGRAM_METRICS_DIR_CLEARED'):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+    os.environ['FOODGRAM_METRICS_DIR_CLEARED'] = '1'
+
+
+def warm_up(log):
+    """Прогревает резолвер URL, каталог продуктов и индекс рецептов."""
+
+    from django.core import checks
+    from django.db import connections
+    from django.urls import get_resolver
+
+    # gunicorn не запускает проверки Django: кэши в памяти процесса при
+    # нескольких воркерах ломают закрепления, лимиты и ленту.
+    for message in checks.run_checks(tags=[checks.Tags.caches]):
+        log.warning('%s', message)
+    get_resolver().url_patterns
+    get_resolver()._populate()
+    try:
+        from recipes.catalogue import get_catalogue
+        from recipes.ingredient_index import ingredient_index
+
+        log.info('Каталог продуктов загружен: %d', len(get_catalogue()))
+        ingredient_index.ensure_fresh()
+        log.info('Индекс продуктов в рецептах загружен: %d рецептов',
+                 int((ingredient_index.totals > 0).sum()))
+    except Exception as error:
+        log.warning('Не удалось прогреть кэши: %s', error)
+    finally:
+        # Соединения с БД не должны переходить в воркеры через fork.
+        connections.close_all()
+
+
+def when_ready(server):
+    if preload_app:
+        warm_up(server.log)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        warm_up(worker.log)
+
+
+def worker_exit(server, worker):
+    # Переходы по коротким ссылкам, ещё не записанные в БД.
+    from recipes.deletion import wait_for_background_deletion
+    from recipes.short_links import clicks
+
+    clicks.flush()
+    # Удаления, поставленные API и админкой, и файлы удалённых рецептов.
+    wait_for_background_deletion()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,17 +1,57 @@
-from django.contrib import admin
-from django.db.models import Count
+from django.contrib import admin, messages
+from django.db.models import Count, QuerySet
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
 
 from django.utils.safestring import mark_safe
 
+from .deletion import (cascade_counts, schedule_recipe_deletion,
+                       schedule_user_deletion)
 from .models import (
     Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingCart,
     Subscriber, User
 )
 
+
+class ChunkedDeletionMixin:
+    """
+    Фоновое удаление из админки через recipes.deletion.
+
+    Страница подтверждения показывает выбранные объекты и число
+    удаляемых вместе с ними строк по моделям, не загружая эти строки:
+    стандартный сбор связанных объектов прочитал бы все рецепты и
+    добавления в избранное автора. Само порционное удаление идёт в
+    фоновом потоке после коммита транзакции админки: внутри неё порции
+    стали бы точками сохранения одной длинной транзакции, а в запросе
+    удаление крупного автора не уложилось бы в таймаут воркера.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        pks = objs.values('pk') if isinstance(objs, QuerySet) \
+            else [obj.pk for obj in objs]
+        counts = cascade_counts(self.model._base_manager.filter(pk__in=pks))
+        model_count, perms_needed = {}, set()
+        for model, count in counts.items():
+            if not count:
+                continue
+            opts = model._meta
+            model_count[opts.verbose_name_plural] = count
+            model_admin = self.admin_site._registry.get(model)
+            if model_admin and not model_admin.has_delete_permission(request):
+                perms_needed.add(opts.verbose_name)
+        return [str(obj) for obj in objs], model_count, perms_needed, []
+
+    def notify_background_deletion(self, request):
+        self.message_user(
+            request,
+            'Связанные строки удаляются в фоне: они могут ещё некоторое '
+            'время оставаться в списках.',
+            messages.INFO,
+        )
+
+
 @admin.register(User)
-class AdminUser(UserAdmin):
+class AdminUser(ChunkedDeletionMixin, UserAdmin):
     list_display = [
         'id', 'username', 'full_name',
         'email', 'preview', 'recipes_count',
@@ -36,6 +76,14 @@ class AdminUser(UserAdmin):
         
         return ""
 
+    def delete_model(self, request, user):
+        schedule_user_deletion([user.pk])
+        self.notify_background_deletion(request)
+
+    def delete_queryset(self, request, queryset):
+        schedule_user_deletion(queryset.values_list('pk', flat=True))
+        self.notify_background_deletion(request)
+
     @admin.display(description='ФИО')
     def full_name(self, user):
         return f'{user.first_name} {user.last_name}'
@@ -87,12 +135,20 @@ class AdminFavorite(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class AdminRecipe(admin.ModelAdmin):
+class AdminRecipe(ChunkedDeletionMixin, admin.ModelAdmin):
     list_display = ['id', 'name', 'cooking_time', 'author', 'favorites', 'products', 'preview']
     search_fields = ['name', 'author__username']
     list_filter = ['author']
     date_hierarchy = 'pub_date'
 
+    def delete_model(self, request, recipe):
+        schedule_recipe_deletion([recipe.pk])
+        self.notify_background_deletion(request)
+
+    def delete_queryset(self, request, queryset):
+        schedule_recipe_deletion(queryset.values_list('pk', flat=True))
+        self.notify_background_deletion(request)
+
     @admin.display(description='В избранном')
     def favorites(self, instance):
         return instance.favorites.count()
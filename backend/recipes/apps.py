@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class RecipesConfig(AppConfig):
-    default_auto_field = "django.db.models.BigAutoField"
-    name = "recipes"
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'recipes'
+
+    def ready(self):
+        from .catalogue import invalidate_catalogue
+        from .documents import ingredient_changed, recipe_changed
+        from .feed import invalidate_author
+        from .ingredient_index import recipe_deleted as unindex_recipe
+        from .models import Ingredient, Recipe
+        from .short_links import recipe_added, recipe_deleted
+
+        post_save.connect(invalidate_catalogue, sender=Ingredient)
+        post_delete.connect(invalidate_catalogue, sender=Ingredient)
+        post_save.connect(recipe_added, sender=Recipe)
+        post_delete.connect(recipe_deleted, sender=Recipe)
+        post_delete.connect(unindex_recipe, sender=Recipe)
+        post_save.connect(invalidate_author, sender=Recipe)
+        post_delete.connect(invalidate_author, sender=Recipe)
+        post_save.connect(recipe_changed, sender=Recipe)
+        post_save.connect(ingredient_changed, sender=Ingredient)
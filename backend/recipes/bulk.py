@@ -0,0 +1,65 @@
+"""
+Пакетное изменение избранного, списков покупок и подписок.
+
+Клиенты, синхронизирующие офлайн-изменения, присылают сразу списки id
+для добавления и удаления. Вместо двух-трёх запросов на каждый id
+пакет обходится четырьмя: проверка существования объектов, чтение уже
+имеющихся связей, одна вставка (bulk_create с ignore_conflicts) и одно
+удаление по IN.
+"""
+from django.db import transaction
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+
+def apply_changes(model, user, field, targets, add=(), remove=(),
+                  exclude=()):
+    """
+    Добавляет и удаляет связи user -> объект через модель model.
+
+    field - имя внешнего ключа на объект (recipe, subscribed_to),
+    targets - queryset допустимых объектов, exclude - id, которые
+    добавлять нельзя (например, подписка на себя). Возвращает список
+    {'id', 'action', 'status'} в порядке add, затем remove.
+    """
+
+    column = f'{field}_id'
+    existing_targets = set(targets.filter(
+        pk__in=set(add)
+    ).values_list('pk', flat=True)) if add else set()
+    linked = set(model.objects.filter(
+        user=user, **{f'{column}__in': set(add) | set(remove)}
+    ).values_list(column, flat=True))
+    results = []
+    to_create = {}
+    for target_id in add:
+        if target_id in exclude:
+            status = SELF
+        elif target_id not in existing_targets:
+            status = NOT_FOUND
+        elif target_id in linked or target_id in to_create:
+            status = EXISTS
+        else:
+            status = ADDED
+            to_create[target_id] = model(user=user, **{column: target_id})
+        results.append({'id': target_id, 'action': 'add', 'status': status})
+    to_delete = set(remove) & linked
+    results.extend(
+        {'id': target_id, 'action': 'remove',
+         'status': REMOVED if target_id in to_delete else NOT_FOUND}
+        for target_id in remove
+    )
+    with transaction.atomic():
+        if to_create:
+            model.objects.bulk_create(
+                to_create.values(), ignore_conflicts=True
+            )
+        if to_delete:
+            model.objects.filter(
+                user=user, **{f'{column}__in': to_delete}
+            ).delete()
+    return results
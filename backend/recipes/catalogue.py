@@ -0,0 +1,42 @@
+"""
+Каталог продуктов в памяти процесса.
+
+Продукты меняются редко (загрузка каталога, админка), а читаются при
+каждом сохранении рецепта, поэтому каждый воркер держит копию
+и перечитывает её раз в INGREDIENT_CATALOGUE_TTL секунд или сразу
+после изменения продуктов в этом процессе.
+"""
+import threading
+import time
+
+from backend_foodgram.metrics import record_cache
+from constants import INGREDIENT_CATALOGUE_TTL
+from .models import Ingredient
+
+_lock = threading.Lock()
+_catalogue = None
+_loaded_at = 0.0
+
+
+def get_catalogue():
+    """Возвращает словарь id -> (название, единица измерения)."""
+
+    global _catalogue, _loaded_at
+    stale = _catalogue is None or \
+        time.monotonic() - _loaded_at > INGREDIENT_CATALOGUE_TTL
+    record_cache('ingredient_catalogue', not stale)
+    if stale:
+        with _lock:
+            _catalogue = {
+                pk: (name, unit) for pk, name, unit in
+                Ingredient.objects.values_list(
+                    'pk', 'name', 'measurement_unit'
+                )
+            }
+            _loaded_at = time.monotonic()
+    return _catalogue
+
+
+def invalidate_catalogue(**kwargs):
+    global _catalogue
+    _catalogue = None
@@ -0,0 +1,195 @@
+"""
+Удаление пользователей и рецептов с большим числом связанных строк.
+
+Django перед удалением собирает связанные объекты: рецепты (на них
+подписаны сигналы) загружаются в память целиком, а избранное,
+списки покупок и продукты рецептов удаляются одним DELETE на все
+рецепты сразу - для автора с десятками тысяч рецептов и миллионами
+добавлений в избранное это долгая транзакция и пик памяти.
+
+Здесь связанные строки удаляются порциями по DELETE_CHUNK_SIZE, каждая
+в своей короткой транзакции, а сами рецепты и пользователь - обычным
+delete(), когда у них почти ничего не осталось (сигналы срабатывают
+как прежде). Файлы изображений удаляются после коммита в фоновом
+потоке и только если на них больше не ссылается ни одна строка:
+импортированные рецепты делят файлы по содержимому.
+
+Удаление автора с десятками тысяч рецептов дольше таймаута воркера,
+поэтому API и админка только ставят его в очередь (schedule_user_deletion,
+schedule_recipe_deletion): пользователь сразу деактивируется, а строки
+удаляются фоновым потоком после коммита. Если воркер остановится
+раньше, неактивный пользователь останется и его можно удалить
+командой delete_users.
+"""
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import CASCADE
+
+from constants import DELETE_CHUNK_SIZE
+from .models import (Favorite, IngredientRecipe, Recipe, ShoppingCart,
+                     Subscriber, User)
+
+logger = logging.getLogger(__name__)
+
+_media_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='media-cleanup'
+)
+_deletion_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='deletion'
+)
+
+
+def delete_in_chunks(queryset, chunk_size=DELETE_CHUNK_SIZE):
+    """Удаляет строки queryset порциями; возвращает их число."""
+
+    model = queryset.model
+    deleted = 0
+    while chunk := list(queryset.values_list('pk', flat=True)[:chunk_size]):
+        with transaction.atomic():
+            count, _ = model.objects.filter(pk__in=chunk).delete()
+        deleted += count
+    return deleted
+
+
+def cascade_counts(queryset):
+    """
+    Число строк по моделям, которые удалятся вместе с queryset, - без
+    загрузки объектов, по запросу COUNT на связь. Строка, связанная с
+    удаляемыми по двум путям (избранное автора на его же рецепт),
+    считается дважды, поэтому это оценка сверху.
+    """
+
+    counts = Counter({queryset.model: queryset.count()})
+    for relation in queryset.model._meta.related_objects:
+        if relation.on_delete is not CASCADE:
+            continue
+        counts.update(cascade_counts(
+            relation.related_model._base_manager.filter(**{
+                f'{relation.field.name}__in': queryset.values('pk'),
+            })
+        ))
+    return counts
+
+
+def unused_files(names):
+    """Файлы из names, на которые не ссылаются рецепты и пользователи."""
+
+    names = set(filter(None, names))
+    if names:
+        names -= set(Recipe.objects.filter(
+            image__in=names
+        ).values_list('image', flat=True))
+    if names:
+        names -= set(User.objects.filter(
+            avatar__in=names
+        ).values_list('avatar', flat=True))
+    return names
+
+
+def remove_files(names):
+    try:
+        for name in unused_files(names):
+            try:
+                default_storage.delete(name)
+            except OSError:
+                logger.exception('Не удалось удалить файл %s', name)
+    finally:
+        close_old_connections()
+
+
+def schedule_file_cleanup(names):
+    """Удаляет файлы в фоне после коммита текущей транзакции."""
+
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(
+            lambda: _media_executor.submit(remove_files, names)
+        )
+
+
+def wait_for_background_deletion():
+    """Дожидается фоновых удалений и затем - удаления их файлов."""
+
+    _deletion_executor.shutdown(wait=True)
+    _media_executor.shutdown(wait=True)
+
+
+def delete_recipes(recipe_ids, chunk_size=DELETE_CHUNK_SIZE):
+    """Удаляет рецепты порциями; возвращает число удалённых рецептов."""
+
+    recipe_ids = iter(recipe_ids)
+    deleted = 0
+    while chunk := list(islice(recipe_ids, chunk_size)):
+        for model in (Favorite, ShoppingCart, IngredientRecipe):
+            delete_in_chunks(
+                model.objects.filter(recipe_id__in=chunk), chunk_size
+            )
+        with transaction.atomic():
+            images = list(Recipe.objects.filter(
+                pk__in=chunk
+            ).values_list('image', flat=True))
+            _, counts = Recipe.objects.filter(pk__in=chunk).delete()
+            schedule_file_cleanup(images)
+        deleted += counts.get(Recipe._meta.label, 0)
+    return deleted
+
+
+def delete_user(user, chunk_size=DELETE_CHUNK_SIZE):
+    """Удаляет пользователя с рецептами, подписками и списками."""
+
+    recipes = Recipe.objects.filter(author=user).values_list('pk', flat=True)
+    while chunk := list(recipes[:chunk_size]):
+        delete_recipes(chunk, chunk_size)
+    for queryset in (
+        Favorite.objects.filter(user=user),
+        ShoppingCart.objects.filter(user=user),
+        Subscriber.objects.filter(user=user),
+        Subscriber.objects.filter(subscribed_to=user),
+    ):
+        delete_in_chunks(queryset, chunk_size)
+    with transaction.atomic():
+        avatar = user.avatar.name
+        user.delete()
+        schedule_file_cleanup([avatar])
+
+
+def _run_in_background(delete, *args):
+    try:
+        delete(*args)
+    except Exception:
+        logger.exception('Фоновое удаление (%s) не завершилось',
+                         delete.__name__)
+    finally:
+        close_old_connections()
+
+
+def _delete_users(user_ids, chunk_size):
+    for user in User.objects.filter(pk__in=user_ids):
+        delete_user(user, chunk_size)
+
+
+def schedule_user_deletion(user_ids, chunk_size=DELETE_CHUNK_SIZE):
+    """
+    Деактивирует пользователей сразу и удаляет их в фоне после коммита
+    текущей транзакции.
+    """
+
+    user_ids = list(user_ids)
+    User.objects.filter(pk__in=user_ids).update(is_active=False)
+    transaction.on_commit(lambda: _deletion_executor.submit(
+        _run_in_background, _delete_users, user_ids, chunk_size
+    ))
+
+
+def schedule_recipe_deletion(recipe_ids, chunk_size=DELETE_CHUNK_SIZE):
+    """Удаляет рецепты в фоне после коммита текущей транзакции."""
+
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: _deletion_executor.submit(
+        _run_in_background, delete_recipes, recipe_ids, chunk_size
+    ))
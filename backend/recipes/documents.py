@@ -0,0 +1,215 @@
+"""
+Готовые документы рецептов для чтения.
+
+Для каждого рецепта в RecipeDocument хранится его представление для
+API (id автора, продукты с названиями и единицами, ссылка на
+изображение) без полей, зависящих от пользователя. Список и детали
+рецептов берут документы одним запросом и дополняют их профилями
+авторов (один запрос на страницу: смена аватара или имени автора не
+пересобирает его рецепты), флагами пользователя (is_favorited,
+is_in_shopping_cart, author.is_subscribed) и полными адресами
+изображений, не собирая рецепт из моделей.
+
+Документ пересобирается после коммита транзакции, в которой
+сохранялся рецепт (API и админка сохраняют его и при изменении
+продуктов рецепта) или продукт каталога. Команды
+import_recipes и generate_fake_data собирают документы вставленных
+рецептов после коммита каждой пачки. Прочие записи в обход сигналов
+(bulk-операции, SQL) документы не обновляют: для них есть команды
+rebuild_recipe_documents и check_recipe_documents.
+Отсутствующий документ собирается при первом чтении.
+"""
+from django.db import router, transaction
+from django.db.models import Prefetch
+
+from backend_foodgram.profiling import profile_phase
+from constants import RECIPES_BATCH_SIZE
+from .models import (Favorite, IngredientRecipe, Recipe, RecipeDocument,
+                     ShoppingCart, Subscriber, User)
+
+AUTHOR_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name',
+                 'avatar')
+
+
+def file_path(file):
+    return file.url if file else None
+
+
+def documents_queryset(recipes):
+    return recipes.prefetch_related(Prefetch(
+        'ingredients_in_recipe',
+        queryset=IngredientRecipe.objects.select_related('ingredient')
+    ))
+
+
+def build_document(recipe):
+    """Представление рецепта как у RecipeReadSerializer без флагов."""
+
+    return {
+        'id': recipe.pk,
+        'author': {'id': recipe.author_id},
+        'ingredients': [
+            {
+                'id': item.ingredient.pk,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in recipe.ingredients_in_recipe.all()
+        ],
+        'name': recipe.name,
+        'image': file_path(recipe.image),
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def build_documents(recipe_ids):
+    """Собирает и сохраняет документы рецептов; возвращает id -> data."""
+
+    # Читаем с основной БД: документ со старыми данными с реплики
+    # перезаписал бы свежий.
+    recipes = documents_queryset(Recipe.objects.using(
+        router.db_for_write(Recipe)
+    ).filter(pk__in=recipe_ids))
+    documents = {recipe.pk: build_document(recipe) for recipe in recipes}
+    RecipeDocument.objects.bulk_create(
+        [RecipeDocument(recipe_id=recipe_id, data=data)
+         for recipe_id, data in documents.items()],
+        update_conflicts=True,
+        unique_fields=['recipe'],
+        update_fields=['data', 'built_at'],
+    )
+    return documents
+
+
+def load_documents(recipe_ids):
+    """Документы рецептов id -> data; недостающие собираются."""
+
+    documents = dict(RecipeDocument.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'data'))
+    missing = set(recipe_ids) - documents.keys()
+    if missing:
+        documents.update(build_documents(missing))
+    return documents
+
+
+def authors_queryset(documents):
+    """Строки AUTHOR_FIELDS авторов документов для author_profiles."""
+
+    return User.objects.filter(pk__in={
+        document['author']['id'] for document in documents
+    }).values_list(*AUTHOR_FIELDS)
+
+
+def author_profiles(rows):
+    """id автора -> его поля в документе (аватар - путь в хранилище)."""
+
+    storage = User._meta.get_field('avatar').storage
+    profiles = {}
+    for row in rows:
+        profile = dict(zip(AUTHOR_FIELDS, row))
+        profile['avatar'] = storage.url(profile['avatar']) \
+            if profile['avatar'] else None
+        profiles[profile['id']] = profile
+    return profiles
+
+
+def user_flags(user, documents):
+    """Избранное, корзина и подписки пользователя тремя запросами."""
+
+    if user is None or not user.is_authenticated:
+        return set(), set(), set()
+    recipe_ids = [document['id'] for document in documents]
+    author_ids = {document['author']['id'] for document in documents}
+    favorited = set(Favorite.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    in_cart = set(ShoppingCart.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    subscribed = set(Subscriber.objects.filter(
+        user=user, subscribed_to_id__in=author_ids
+    ).values_list('subscribed_to_id', flat=True))
+    return favorited, in_cart, subscribed
+
+
+def render(request, document, authors, favorited, in_cart, subscribed):
+    """
+    Документ с профилем автора, флагами пользователя и полными адресами
+    изображений.
+    """
+
+    author = authors[document['author']['id']]
+    return {
+        'id': document['id'],
+        'author': {
+            'email': author['email'],
+            'id': author['id'],
+            'username': author['username'],
+            'first_name': author['first_name'],
+            'last_name': author['last_name'],
+            'is_subscribed': author['id'] in subscribed,
+            'avatar': author['avatar'] and request.build_absolute_uri(
+                author['avatar']
+            ),
+        },
+        'ingredients': document['ingredients'],
+        'is_favorited': document['id'] in favorited,
+        'is_in_shopping_cart': document['id'] in in_cart,
+        'name': document['name'],
+        'image': document['image'] and request.build_absolute_uri(
+            document['image']
+        ),
+        'text': document['text'],
+        'cooking_time': document['cooking_time'],
+    }
+
+
+def render_recipes(request, recipe_ids):
+    """Рецепты в порядке recipe_ids, как их отдаёт RecipeReadSerializer."""
+
+    with profile_phase('serialize'):
+        documents = load_documents(recipe_ids)
+        documents = [
+            documents[recipe_id] for recipe_id in recipe_ids
+            if recipe_id in documents
+        ]
+        authors = author_profiles(authors_queryset(documents))
+        # Автор мог быть удалён вместе с рецептами после чтения документов.
+        documents = [
+            document for document in documents
+            if document['author']['id'] in authors
+        ]
+        flags = user_flags(request.user, documents)
+        return [
+            render(request, document, authors, *flags)
+            for document in documents
+        ]
+
+
+def rebuild_in_batches(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), RECIPES_BATCH_SIZE):
+        build_documents(recipe_ids[start:start + RECIPES_BATCH_SIZE])
+
+
+def schedule_rebuild(recipe_ids):
+    """Пересобирает документы после коммита текущей транзакции."""
+
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: rebuild_in_batches(recipe_ids))
+
+
+def recipe_changed(sender, instance, **kwargs):
+    schedule_rebuild([instance.pk])
+
+
+def ingredient_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    schedule_rebuild(IngredientRecipe.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True).distinct())
@@ -0,0 +1,132 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+
+Лента собирается при чтении: для каждого автора в кэше
+FEED_CACHE_ALIAS лежит список его последних FEED_AUTHOR_RECENT рецептов
+(pub_date, id), недостающие списки читаются из БД одним запросом по
+индексу (author, -pub_date). Страница - слияние списков по убыванию
+(pub_date, id) после курсора. Если страница уходит глубже, чем
+хватает закэшированных списков, она читается из БД целиком.
+
+Кэш должен быть общим для воркеров: иначе после публикации рецепта
+воркеры, не получившие сигнал, до FEED_CACHE_TTL отдают старую ленту.
+"""
+import base64
+import binascii
+import heapq
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from backend_foodgram.metrics import record_cache
+from constants import FEED_AUTHOR_RECENT, FEED_CACHE_TTL
+from .models import Recipe
+
+CACHE_KEY_PREFIX = 'feed:author:'
+
+
+def _cache_key(author_id):
+    return f'{CACHE_KEY_PREFIX}{author_id}'
+
+
+def _cache():
+    return caches[settings.FEED_CACHE_ALIAS]
+
+
+def encode_cursor(key):
+    pub_date, recipe_id = key
+    return base64.urlsafe_b64encode(
+        f'{pub_date.isoformat()}|{recipe_id}'.encode()
+    ).decode()
+
+
+def decode_cursor(cursor):
+    """(pub_date, id) или ValueError для испорченного курсора."""
+
+    try:
+        pub_date, recipe_id = base64.urlsafe_b64decode(
+            cursor.encode()
+        ).decode().split('|')
+        pub_date, recipe_id = datetime.fromisoformat(pub_date), int(recipe_id)
+        # Даты рецептов с часовым поясом: наивную с ними не сравнить.
+        if pub_date.utcoffset() is None:
+            raise ValueError('Дата курсора без часового пояса.')
+        return pub_date, recipe_id
+    except (binascii.Error, UnicodeError, ValueError) as error:
+        raise ValueError('Некорректный курсор.') from error
+
+
+def recent_recipes(author_ids):
+    """Словарь автор -> последние рецепты [(pub_date, id), ...]."""
+
+    cached = _cache().get_many(
+        [_cache_key(author_id) for author_id in author_ids]
+    )
+    recent = {}
+    missing = []
+    for author_id in author_ids:
+        key = _cache_key(author_id)
+        if key in cached:
+            recent[author_id] = cached[key]
+        else:
+            missing.append(author_id)
+    record_cache('feed', not missing)
+    if missing:
+        loaded = {author_id: [] for author_id in missing}
+        rows = Recipe.objects.filter(author_id__in=missing).annotate(
+            position=Window(
+                RowNumber(), partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).filter(position__lte=FEED_AUTHOR_RECENT).order_by(
+            'author_id', '-pub_date', '-id'
+        ).values_list('author_id', 'pub_date', 'id')
+        for author_id, pub_date, recipe_id in rows:
+            loaded[author_id].append((pub_date, recipe_id))
+        _cache().set_many(
+            {_cache_key(author_id): items
+             for author_id, items in loaded.items()},
+            FEED_CACHE_TTL,
+        )
+        recent.update(loaded)
+    return recent
+
+
+def feed_page(author_ids, limit, after=None):
+    """
+    Ключи (pub_date, id) следующей страницы ленты, новые первыми,
+    и признак того, что после неё есть ещё рецепты.
+    """
+
+    recent = recent_recipes(author_ids)
+    # Глубже последнего элемента списка, обрезанного до
+    # FEED_AUTHOR_RECENT, кэшу верить нельзя: у автора есть рецепты старше.
+    horizon = max(
+        (items[-1] for items in recent.values()
+         if len(items) >= FEED_AUTHOR_RECENT),
+        default=None,
+    )
+    merged = heapq.merge(*recent.values(), reverse=True)
+    if after is not None:
+        merged = (key for key in merged if key < after)
+    keys = list(islice(merged, limit + 1))
+    if horizon is None or (len(keys) > limit and keys[limit] > horizon):
+        return keys[:limit], len(keys) > limit
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if after is not None:
+        pub_date, recipe_id = after
+        recipes = recipes.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=recipe_id)
+        )
+    keys = list(recipes.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id'
+    )[:limit + 1])
+    return keys[:limit], len(keys) > limit
+
+
+def invalidate_author(sender, instance, **kwargs):
+    _cache().delete(_cache_key(instance.author_id))
@@ -0,0 +1,188 @@
+"""
+Обратный индекс продукт -> рецепты для подбора рецептов по имеющимся
+продуктам ("что приготовить").
+
+Каждый воркер держит в памяти для каждого продукта отсортированный
+массив id рецептов и массив числа продуктов в рецепте (индекс - id
+рецепта). Запрос считается без обращения к БД: массивы рецептов
+выбранных продуктов склеиваются и считаются через numpy.bincount.
+
+Изменения, сделанные в этом процессе, попадают в индекс сразу.
+Изменения из других процессов подтягиваются не реже чем раз в
+RECIPE_INDEX_REFRESH секунд по новым строкам IngredientRecipe
+(при сохранении рецепта они пересоздаются) одним проходом по
+массивам; если изменилось больше RECIPE_INDEX_REBUILD_THRESHOLD
+рецептов (импорт, генерация данных), индекс строится заново - это
+быстрее. Раз в RECIPE_INDEX_TTL секунд индекс тоже строится заново -
+так уходят рецепты, удалённые в других процессах.
+"""
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from constants import (RECIPE_INDEX_REBUILD_THRESHOLD, RECIPE_INDEX_REFRESH,
+                       RECIPE_INDEX_TTL)
+from .models import IngredientRecipe
+
+ID_DTYPE = np.int64
+COUNT_DTYPE = np.int32
+LOAD_CHUNK_SIZE = 50000
+
+
+class IngredientIndex:
+    """Массивы рецептов по продуктам и число продуктов в рецептах."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = None
+        self.totals = np.zeros(0, dtype=COUNT_DTYPE)
+        self.last_row_id = 0
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+
+    def _load(self):
+        grouped = defaultdict(list)
+        totals = defaultdict(int)
+        last_row_id = 0
+        rows = IngredientRecipe.objects.values_list(
+            'id', 'ingredient_id', 'recipe_id'
+        ).order_by()
+        for row_id, ingredient_id, recipe_id in rows.iterator(
+            chunk_size=LOAD_CHUNK_SIZE
+        ):
+            grouped[ingredient_id].append(recipe_id)
+            totals[recipe_id] += 1
+            last_row_id = max(last_row_id, row_id)
+        self.postings = {
+            ingredient_id: np.unique(np.array(recipe_ids, dtype=ID_DTYPE))
+            for ingredient_id, recipe_ids in grouped.items()
+        }
+        self.totals = np.zeros(max(totals, default=0) + 1, dtype=COUNT_DTYPE)
+        if totals:
+            self.totals[np.fromiter(totals, dtype=ID_DTYPE)] = \
+                np.fromiter(totals.values(), dtype=COUNT_DTYPE)
+        self.last_row_id = last_row_id
+        self.loaded_at = self.refreshed_at = time.monotonic()
+
+    def _replace(self, ingredients):
+        """
+        Заменяет продукты рецептов {id рецепта: id продуктов} (пустой
+        список - рецепт удалён) одним проходом по массивам.
+        """
+
+        changed = np.fromiter(ingredients, dtype=ID_DTYPE)
+        indexed = changed[changed < len(self.totals)]
+        indexed = indexed[self.totals[indexed] > 0]
+        if len(indexed):
+            for ingredient_id, recipe_ids in self.postings.items():
+                stale = np.isin(recipe_ids, indexed, assume_unique=True)
+                if stale.any():
+                    # Новый массив, а не изменение на месте: его может
+                    # сейчас читать другой поток.
+                    self.postings[ingredient_id] = recipe_ids[~stale]
+            self.totals[indexed] = 0
+        added = defaultdict(list)
+        for recipe_id, ingredient_ids in ingredients.items():
+            for ingredient_id in set(ingredient_ids):
+                added[ingredient_id].append(recipe_id)
+        if len(changed) and changed.max() >= len(self.totals):
+            self.totals = np.concatenate((self.totals, np.zeros(
+                max(changed.max() + 1 - len(self.totals),
+                    len(self.totals) // 4),
+                dtype=COUNT_DTYPE
+            )))
+        for ingredient_id, recipe_ids in added.items():
+            self.postings[ingredient_id] = np.union1d(
+                self.postings.get(ingredient_id, np.zeros(0, dtype=ID_DTYPE)),
+                np.array(recipe_ids, dtype=ID_DTYPE),
+            )
+        for recipe_id, ingredient_ids in ingredients.items():
+            self.totals[recipe_id] = len(set(ingredient_ids))
+
+    def _refresh(self):
+        rows = IngredientRecipe.objects.filter(
+            id__gt=self.last_row_id
+        ).values_list('recipe_id', flat=True).order_by().distinct()
+        changed = set(rows)
+        self.refreshed_at = time.monotonic()
+        if not changed:
+            return
+        if len(changed) > RECIPE_INDEX_REBUILD_THRESHOLD:
+            self._load()
+            return
+        grouped = {recipe_id: [] for recipe_id in changed}
+        for row_id, recipe_id, ingredient_id in IngredientRecipe.objects \
+                .filter(recipe_id__in=changed) \
+                .values_list('id', 'recipe_id', 'ingredient_id'):
+            grouped[recipe_id].append(ingredient_id)
+            self.last_row_id = max(self.last_row_id, row_id)
+        self._replace(grouped)
+
+    def ensure_fresh(self):
+        """Загружает или обновляет индекс, если он устарел."""
+
+        now = time.monotonic()
+        if self.postings is None or now - self.loaded_at > RECIPE_INDEX_TTL:
+            with self.lock:
+                if self.postings is None \
+                        or now - self.loaded_at > RECIPE_INDEX_TTL:
+                    self._load()
+        elif now - self.refreshed_at > RECIPE_INDEX_REFRESH:
+            with self.lock:
+                if now - self.refreshed_at > RECIPE_INDEX_REFRESH:
+                    self._refresh()
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """Рецепт сохранён в этом процессе с данным набором продуктов."""
+
+        with self.lock:
+            if self.postings is None:
+                return
+            self._replace({recipe_id: ingredient_ids})
+
+    def remove_recipe(self, recipe_id):
+        with self.lock:
+            if self.postings is not None:
+                self._replace({recipe_id: []})
+
+    def match(self, ingredient_ids, max_missing=None):
+        """
+        id рецептов, в которых есть хотя бы один из продуктов, по
+        убыванию доли имеющихся продуктов, затем по возрастанию числа
+        недостающих; и массивы этих долей и недостающих продуктов.
+        """
+
+        self.ensure_fresh()
+        postings, totals = self.postings, self.totals
+        lists = [
+            postings[ingredient_id] for ingredient_id in set(ingredient_ids)
+            if ingredient_id in postings
+        ]
+        if not lists:
+            empty = np.zeros(0, dtype=ID_DTYPE)
+            return empty, empty.astype(float), empty
+        have = np.bincount(np.concatenate(lists), minlength=len(totals))
+        candidates = np.flatnonzero(have[:len(totals)])
+        have = have[candidates]
+        total = totals[candidates]
+        # Рецепт мог быть удалён между чтением postings и totals.
+        alive = total > 0
+        candidates, have, total = candidates[alive], have[alive], total[alive]
+        missing = total - have
+        if max_missing is not None:
+            fits = missing <= max_missing
+            candidates, have = candidates[fits], have[fits]
+            total, missing = total[fits], missing[fits]
+        coverage = have / total
+        # Последний ключ lexsort - главный; новые рецепты выше при равенстве.
+        order = np.lexsort((-candidates, missing, -coverage))
+        return candidates[order], coverage[order], missing[order]
+
+
+ingredient_index = IngredientIndex()
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    ingredient_index.remove_recipe(instance.pk)
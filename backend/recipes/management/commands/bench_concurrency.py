@@ -0,0 +1,78 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench_requests import percentile
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенный сервер параллельными GET-запросами и '
+            'сравнивает пропускную способность, например gunicorn (WSGI) '
+            'и gunicorn с UvicornWorker (ASGI, ASYNC_READ_VIEWS=1).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'base_urls', nargs='+',
+            help='Адреса серверов, например http://127.0.0.1:8000',
+        )
+        parser.add_argument(
+            '--paths', nargs='+',
+            default=['/api/recipes/', '/api/ingredients/?name=а'],
+            help='Пути, которые запрашиваются по кругу',
+        )
+        parser.add_argument(
+            '-c', '--concurrency', type=int, default=50,
+            help='Количество одновременных соединений',
+        )
+        parser.add_argument(
+            '-n', '--requests', type=int, default=2000,
+            help='Общее количество запросов к каждому серверу',
+        )
+        parser.add_argument(
+            '--token', help='Токен пользователя для авторизованных запросов',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError(
+                '--concurrency и --requests должны быть положительными.'
+            )
+        for base_url in options['base_urls']:
+            self._bench(base_url.rstrip('/'), options)
+
+    def _bench(self, base_url, options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        paths = options['paths']
+        local = threading.local()
+
+        def fetch(index):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            started = time.perf_counter()
+            response = session.get(
+                base_url + paths[index % len(paths)],
+                headers=headers, allow_redirects=False,
+            )
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(fetch, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        timings = sorted(timing * 1000 for timing, _ in results)
+        errors = sum(1 for _, status in results if status >= 400)
+        self.stdout.write(
+            f'{base_url}: {len(results) / elapsed:.1f} запросов/с, '
+            f'ошибок {errors}, среднее {statistics.mean(timings):.1f} мс, '
+            f'p50 {percentile(timings, 0.5):.1f} мс, '
+            f'p95 {percentile(timings, 0.95):.1f} мс, '
+            f'p99 {percentile(timings, 0.99):.1f} мс'
+        )
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку запросов к API через полный цикл Django. '
+            'Тестовый Client отключает close_old_connections от сигналов '
+            'request_started/finished, поэтому команда вызывает его сама '
+            'вокруг каждого запроса: соединения с БД закрываются или '
+            'возвращаются в пул так же, как под gunicorn, и замер '
+            'включает их открытие. Для сравнения режимов запустите '
+            'команду с разными POSTGRES_CONN_MAX_AGE и POSTGRES_POOL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=['/api/recipes/', '/api/ingredients/'],
+            help='Адреса для запросов',
+        )
+        parser.add_argument(
+            '-n', '--requests', type=int, default=200,
+            help='Количество запросов к каждому адресу',
+        )
+        parser.add_argument(
+            '--token', help='Токен пользователя для авторизованных запросов',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='Количество разогревающих запросов, не входящих в замер',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должен быть положительным.')
+        database = settings.DATABASES['default']
+        self.stdout.write(
+            f'БД: {connection.vendor}, '
+            f'CONN_MAX_AGE={database.get("CONN_MAX_AGE", 0)}, '
+            f'CONN_HEALTH_CHECKS={database.get("CONN_HEALTH_CHECKS", False)}, '
+            f'pool={database.get("OPTIONS", {}).get("pool", False)}, '
+            f'TOKEN_AUTH_CACHE_TTL={settings.TOKEN_AUTH_CACHE_TTL}'
+        )
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0], headers=headers)
+
+        def request(path):
+            # Как обработчики request_started и request_finished под WSGI.
+            close_old_connections()
+            try:
+                return client.get(path)
+            finally:
+                close_old_connections()
+
+        for path in options['paths']:
+            for _ in range(options['warmup']):
+                request(path)
+            timings = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                response = request(path)
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{path} вернул {response.status_code}'
+                    )
+            timings.sort()
+            self.stdout.write(
+                f'{path}: среднее {statistics.mean(timings):.2f} мс, '
+                f'p50 {percentile(timings, 0.5):.2f} мс, '
+                f'p95 {percentile(timings, 0.95):.2f} мс, '
+                f'p99 {percentile(timings, 0.99):.2f} мс'
+            )
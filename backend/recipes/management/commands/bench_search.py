@@ -0,0 +1,57 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from constants import PAGE_SIZE
+from recipes.models import Recipe
+from recipes.search import search_recipes
+from .bench_requests import percentile
+
+
+class Command(BaseCommand):
+    help = ('Замеряет полнотекстовый поиск рецептов: первую страницу '
+            'выдачи и подсчёт найденного, как в /api/recipes/?search=. '
+            'Для замера на больших объёмах (1 млн рецептов) заполните БД '
+            'командой import_recipes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queries', nargs='*',
+            default=['борщ', 'курица с рисом', 'сыр', 'шокол'],
+            help='Поисковые запросы',
+        )
+        parser.add_argument(
+            '-n', '--repeat', type=int, default=20,
+            help='Количество повторов каждого запроса',
+        )
+        parser.add_argument(
+            '--explain', action='store_true',
+            help='Вывести план выполнения каждого запроса',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным.')
+        self.stdout.write(
+            f'БД: {connection.vendor}, рецептов: {Recipe.objects.count()}'
+        )
+        for query in options['queries']:
+            recipes = search_recipes(Recipe.objects.all(), query)
+            if options['explain']:
+                self.stdout.write(recipes[:PAGE_SIZE].explain())
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                count = recipes.count()
+                page = list(recipes[:PAGE_SIZE])
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{query!r}: найдено {count}, '
+                f'первые: {", ".join(recipe.name for recipe in page[:3])}; '
+                f'среднее {statistics.mean(timings):.2f} мс, '
+                f'p50 {percentile(timings, 0.5):.2f} мс, '
+                f'p95 {percentile(timings, 0.95):.2f} мс'
+            )
@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from constants import SIMILAR_RECIPES_COUNT, SIMILARITY_BATCH_SIZE
+from recipes.models import IngredientRecipe, SimilarRecipes
+from recipes.similarity import METRICS, build_matrix, nearest
+
+
+class Command(BaseCommand):
+    help = ('Строит списки похожих рецептов для /api/recipes/{id}/similar/. '
+            'По умолчанию пересчитывает только рецепты, продукты которых '
+            'изменились после прошлого запуска, и их соседей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты',
+        )
+        parser.add_argument(
+            '--metric', choices=METRICS, default='jaccard',
+            help='Мера сходства наборов продуктов',
+        )
+        parser.add_argument(
+            '--count', type=int, default=SIMILAR_RECIPES_COUNT,
+            help='Количество похожих рецептов для каждого рецепта',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=SIMILARITY_BATCH_SIZE,
+            help='Количество рецептов, обрабатываемых за один проход',
+        )
+
+    def handle(self, *args, **options):
+        if options['count'] < 1 or options['batch_size'] < 1:
+            raise CommandError(
+                '--count и --batch-size должны быть положительными.'
+            )
+        started = time.perf_counter()
+        matrix = build_matrix()
+        self.stdout.write(
+            f'Матрица: рецептов {len(matrix.recipe_ids)}, '
+            f'продуктов {matrix.column_count}, '
+            f'связей {len(matrix.indices)} '
+            f'({time.perf_counter() - started:.1f} с).'
+        )
+        if not len(matrix.recipe_ids):
+            return
+        last_row_id = None if options['full'] else SimilarRecipes.objects \
+            .aggregate(last=Max('built_row_id'))['last']
+        if not last_row_id:
+            self.process(matrix, np.arange(len(matrix.recipe_ids)), options)
+            processed = len(matrix.recipe_ids)
+        else:
+            changed = np.array(sorted(IngredientRecipe.objects.filter(
+                id__gt=last_row_id
+            ).values_list('recipe_id', flat=True).distinct()), dtype=np.int64)
+            # Старые соседи изменённых рецептов тоже могут поменять списки.
+            previous = {
+                recipe_id
+                for neighbours in SimilarRecipes.objects.filter(
+                    recipe_id__in=changed.tolist()
+                ).values_list('neighbours', flat=True)
+                for recipe_id, _ in neighbours
+            }
+            changed_rows = matrix.rows(changed)
+            neighbours = self.process(matrix, changed_rows, options)
+            related = (previous | neighbours) - set(changed.tolist())
+            related_rows = matrix.rows(
+                np.array(sorted(related), dtype=np.int64)
+            )
+            self.process(matrix, related_rows, options)
+            processed = len(changed_rows) + len(related_rows)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Пересчитано рецептов: {processed}, '
+            f'время: {time.perf_counter() - started:.1f} с.'
+        ))
+
+    def process(self, matrix, rows, options):
+        """Пересчитывает и сохраняет соседей строк; возвращает их id."""
+
+        found = set()
+        batch_size = options['batch_size']
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            neighbour_rows, scores = nearest(
+                matrix, batch, options['count'], options['metric']
+            )
+            objects = []
+            for row, recipe_rows, recipe_scores in zip(
+                batch, neighbour_rows, scores
+            ):
+                neighbours = [
+                    [int(matrix.recipe_ids[neighbour]), round(float(score), 4)]
+                    for neighbour, score in zip(recipe_rows, recipe_scores)
+                    if score > 0
+                ]
+                found.update(recipe_id for recipe_id, _ in neighbours)
+                objects.append(SimilarRecipes(
+                    recipe_id=int(matrix.recipe_ids[row]),
+                    neighbours=neighbours,
+                    built_row_id=matrix.last_row_id,
+                ))
+            with transaction.atomic():
+                SimilarRecipes.objects.bulk_create(
+                    objects,
+                    update_conflicts=True,
+                    unique_fields=['recipe'],
+                    update_fields=['neighbours', 'built_row_id'],
+                )
+            done = min(start + batch_size, len(rows))
+            self.stdout.write(
+                f'... обработано рецептов: {done} из {len(rows)}'
+            )
+        return found
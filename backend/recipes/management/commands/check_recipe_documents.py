@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from constants import RECIPES_BATCH_SIZE
+from recipes.documents import (build_document, build_documents,
+                               documents_queryset)
+from recipes.models import Recipe, RecipeDocument
+from .compute_popularity import all_recipe_batches
+
+
+class Command(BaseCommand):
+    help = ('Сверяет готовые документы рецептов с данными моделей и '
+            'выводит отсутствующие и устаревшие. С --fix пересобирает их.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересобрать отсутствующие и устаревшие документы',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RECIPES_BATCH_SIZE,
+            help='Количество рецептов за один проход',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        checked = 0
+        broken = {'missing': [], 'stale': []}
+        for batch in all_recipe_batches(options['batch_size']):
+            stored = dict(RecipeDocument.objects.filter(
+                recipe_id__in=batch
+            ).values_list('recipe_id', 'data'))
+            wrong = []
+            for recipe in documents_queryset(Recipe.objects.filter(
+                pk__in=batch
+            )):
+                if recipe.pk not in stored:
+                    broken['missing'].append(recipe.pk)
+                elif stored[recipe.pk] != build_document(recipe):
+                    broken['stale'].append(recipe.pk)
+                else:
+                    continue
+                wrong.append(recipe.pk)
+            if options['fix'] and wrong:
+                build_documents(wrong)
+            checked += len(batch)
+        self.stdout.write(f'Проверено рецептов: {checked}.')
+        for problem, title in (('missing', 'Нет документа'),
+                               ('stale', 'Устаревший документ')):
+            recipe_ids = broken[problem]
+            if recipe_ids:
+                self.stdout.write(self.style.WARNING(
+                    f'{title}: {len(recipe_ids)} '
+                    f'(id: {", ".join(map(str, recipe_ids[:20]))}'
+                    f'{", ..." if len(recipe_ids) > 20 else ""})'
+                ))
+        if not any(broken.values()):
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS('Документы пересобраны.'))
+        else:
+            raise CommandError(
+                'Документы расходятся с данными; запустите с --fix.'
+            )
@@ -0,0 +1,42 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.deletion import unused_files
+from recipes.models import Recipe, User
+
+CHECK_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы изображений рецептов и аватаров, на которые '
+            'не ссылается ни одна строка БД (остались после удалений '
+            'в обход deletion.py или после сбоя фоновой очистки).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только вывести файлы, которые будут удалены',
+        )
+
+    def handle(self, *args, **options):
+        removed = 0
+        for model, field in ((Recipe, 'image'), (User, 'avatar')):
+            directory = model._meta.get_field(field).upload_to
+            if not default_storage.exists(directory):
+                continue
+            _, files = default_storage.listdir(directory)
+            names = [os.path.join(directory, name) for name in files]
+            for start in range(0, len(names), CHECK_BATCH_SIZE):
+                for name in sorted(unused_files(
+                    names[start:start + CHECK_BATCH_SIZE]
+                )):
+                    self.stdout.write(name)
+                    if not options['dry_run']:
+                        default_storage.delete(name)
+                    removed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Найдено" if options["dry_run"] else "Удалено"} '
+            f'файлов: {removed}.'
+        ))
@@ -0,0 +1,73 @@
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from constants import RECIPES_BATCH_SIZE
+from recipes.models import Recipe
+from recipes.popularity import (compute_scores, last_computed_at,
+                                touched_recipes)
+
+
+def all_recipe_batches(batch_size):
+    last_id = 0
+    while batch := list(Recipe.objects.filter(id__gt=last_id).order_by(
+        'id'
+    ).values_list('id', flat=True)[:batch_size]):
+        yield batch
+        last_id = batch[-1]
+
+
+def batches(recipe_ids, batch_size):
+    recipe_ids = iter(recipe_ids)
+    while batch := list(islice(recipe_ids, batch_size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает популярность рецептов для ?ordering=popular. '
+            'По умолчанию только рецепты, добавленные в избранное или '
+            'списки покупок после прошлого запуска; запускайте '
+            'периодически (cron), а --full - например, раз в сутки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты (учитывает удаления из избранного)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RECIPES_BATCH_SIZE,
+            help='Количество рецептов в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        started = time.perf_counter()
+        computed_at = timezone.now()
+        since = None if options['full'] else last_computed_at()
+        if since is None:
+            recipe_batches = all_recipe_batches(options['batch_size'])
+            self.stdout.write('Полный пересчёт популярности.')
+        else:
+            recipe_batches = batches(
+                sorted(touched_recipes(since)), options['batch_size']
+            )
+            self.stdout.write(
+                'Пересчёт рецептов с добавлениями после '
+                f'{since:%d.%m.%Y %H:%M:%S}.'
+            )
+        processed = 0
+        for batch in recipe_batches:
+            with transaction.atomic():
+                compute_scores(batch, computed_at)
+            processed += len(batch)
+            self.stdout.write(f'... обработано рецептов: {processed}')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Рецептов: {processed}, '
+            f'время: {elapsed:.1f} с, '
+            f'{processed / elapsed if elapsed else 0:.0f} рецептов/с.'
+        ))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from constants import DELETE_CHUNK_SIZE
+from recipes.deletion import delete_user
+from recipes.models import User
+
+
+class Command(BaseCommand):
+    help = ('Удаляет пользователей со всеми рецептами, подписками, '
+            'избранным и списками покупок порциями, без загрузки '
+            'связанных строк в память; изображения удаляются в фоне.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'users', nargs='+',
+            help='id или email пользователей',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DELETE_CHUNK_SIZE,
+            help='Количество строк, удаляемых в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным.')
+        for reference in options['users']:
+            lookup = {'pk': reference} if reference.isdigit() \
+                else {'email__iexact': reference}
+            user = User.objects.filter(**lookup).first()
+            if user is None:
+                raise CommandError(f'Пользователь {reference} не найден.')
+            started = time.perf_counter()
+            recipes = user.recipes.count()
+            delete_user(user, options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Удалён {user.email}: рецептов {recipes}, '
+                f'время {time.perf_counter() - started:.1f} с.'
+            ))
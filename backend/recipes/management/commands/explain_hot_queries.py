@@ -0,0 +1,112 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Sum
+
+from constants import PAGE_SIZE
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Subscriber, User)
+from recipes.popularity import order_by_popularity
+from recipes.search import search_recipes
+
+
+class Command(BaseCommand):
+    help = ('Выводит планы выполнения запросов, которые делают '
+            'нагруженные эндпоинты API, чтобы проверить, что каждый '
+            'из них идёт по индексу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Выполнить запросы и показать фактическое время '
+                 '(только PostgreSQL)',
+        )
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя для запросов от его имени',
+        )
+        parser.add_argument(
+            '--recipe', type=int,
+            help='id рецепта для запросов по рецепту',
+        )
+
+    def handle(self, *args, **options):
+        user_id = options['user'] or User.objects.values_list(
+            'id', flat=True
+        ).order_by('id').first() or 1
+        recipe_id = options['recipe'] or Recipe.objects.values_list(
+            'id', flat=True
+        ).order_by('id').first() or 1
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options = {'analyze': True, 'buffers': True}
+        self.stdout.write(
+            f'БД: {connection.vendor}, пользователь {user_id}, '
+            f'рецепт {recipe_id}'
+        )
+        for title, queryset in self.queries(user_id, recipe_id):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{title}'))
+            self.stdout.write(queryset.explain(**explain_options))
+
+    def queries(self, user_id, recipe_id):
+        recipes = Recipe.objects.select_related('author')
+        author_ids = Subscriber.objects.filter(
+            user_id=user_id
+        ).values_list('subscribed_to_id', flat=True)
+        return [
+            ('GET /api/recipes/', recipes[:PAGE_SIZE]),
+            ('GET /api/recipes/?author=',
+             recipes.filter(author_id=user_id)[:PAGE_SIZE]),
+            ('GET /api/recipes/?is_favorited=1',
+             recipes.filter(favorites__user_id=user_id)[:PAGE_SIZE]),
+            ('GET /api/recipes/?is_in_shopping_cart=1',
+             recipes.filter(
+                 shopping_cart_items__user_id=user_id
+             )[:PAGE_SIZE]),
+            ('GET /api/recipes/?ordering=popular',
+             order_by_popularity(recipes)[:PAGE_SIZE]),
+            ('GET /api/recipes/?search=',
+             search_recipes(recipes, 'суп')[:PAGE_SIZE]),
+            ('GET /api/recipes/feed/',
+             Recipe.objects.filter(author_id__in=author_ids).order_by(
+                 '-pub_date', '-id'
+             ).values_list('pub_date', 'id')[:PAGE_SIZE + 1]),
+            ('is_favorited в сериализаторе рецепта',
+             Favorite.objects.filter(user_id=user_id, recipe_id=recipe_id)),
+            ('is_in_shopping_cart в сериализаторе рецепта',
+             ShoppingCart.objects.filter(
+                 user_id=user_id, recipe_id=recipe_id
+             )),
+            ('Число добавлений рецепта в избранное',
+             Favorite.objects.filter(recipe_id=recipe_id).values(
+                 'recipe_id'
+             ).annotate(count=Count('user_id'))),
+            ('Число добавлений рецепта в списки покупок',
+             ShoppingCart.objects.filter(recipe_id=recipe_id).values(
+                 'recipe_id'
+             ).annotate(count=Count('user_id'))),
+            ('GET /api/users/',
+             User.objects.all()[:PAGE_SIZE]),
+            ('GET /api/users/subscriptions/',
+             User.objects.filter(
+                 subscriptions_of__user_id=user_id
+             )[:PAGE_SIZE]),
+            ('Подписчики автора',
+             Subscriber.objects.filter(subscribed_to_id=user_id)),
+            ('is_subscribed в сериализаторе пользователя',
+             Subscriber.objects.filter(
+                 user_id=user_id, subscribed_to_id=recipe_id
+             )),
+            ('GET /api/ingredients/',
+             Ingredient.objects.all()),
+            ('GET /api/ingredients/?name=',
+             Ingredient.objects.filter(name__istartswith='мол')),
+            ('GET /api/recipes/download_shopping_cart/',
+             IngredientRecipe.objects.filter(
+                 recipe__shopping_cart_items__user_id=user_id
+             ).values(
+                 'ingredient__name', 'ingredient__measurement_unit',
+                 'ingredient__id',
+             ).annotate(
+                 total_amount=Sum('amount')
+             ).order_by('-ingredient__name')),
+        ]
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from constants import RECIPES_BATCH_SIZE
+from recipes.models import IngredientRecipe, Recipe
+
+
+def image_reference(image, images_dir):
+    """
+    Возвращает имя картинки по хешу содержимого и при необходимости
+    копирует файл в каталог выгрузки (одинаковые картинки пишутся один раз).
+    """
+
+    if not image:
+        return None
+    digest = hashlib.sha256()
+    with image.open('rb') as source:
+        for block in iter(lambda: source.read(64 * 1024), b''):
+            digest.update(block)
+        reference = digest.hexdigest() + Path(image.name).suffix.lower()
+        if images_dir is not None:
+            target = images_dir / reference
+            if not target.exists():
+                source.seek(0)
+                with open(target, 'wb') as destination:
+                    shutil.copyfileobj(source, destination)
+    return reference
+
+
+def recipe_document(recipe, images_dir):
+    return {
+        'author': {
+            'email': recipe.author.email,
+            'username': recipe.author.username,
+            'first_name': recipe.author.first_name,
+            'last_name': recipe.author.last_name,
+        },
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': image_reference(recipe.image, images_dir),
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in recipe.ingredients_in_recipe.all()
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Выгружает рецепты с продуктами и авторами в JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл JSONL (по умолчанию stdout)',
+        )
+        parser.add_argument(
+            '--images-dir',
+            help='Каталог, куда копировать картинки под именами-хешами',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RECIPES_BATCH_SIZE,
+            help='Размер пачки при чтении из БД',
+        )
+
+    def handle(self, *args, **options):
+        images_dir = None
+        if options['images_dir']:
+            images_dir = Path(options['images_dir'])
+            images_dir.mkdir(parents=True, exist_ok=True)
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            )
+        ).order_by('pk')
+
+        to_stdout = options['path'] == '-'
+        output = sys.stdout if to_stdout else open(
+            options['path'], 'w', encoding='utf-8'
+        )
+        exported = 0
+        started = time.perf_counter()
+        try:
+            for recipe in recipes.iterator(chunk_size=options['batch_size']):
+                output.write(json.dumps(
+                    recipe_document(recipe, images_dir), ensure_ascii=False
+                ) + '\n')
+                exported += 1
+        finally:
+            if not to_stdout:
+                output.close()
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stderr.write(
+            f'Выгружено рецептов: {exported}, '
+            f'{exported / elapsed:.0f} рецептов/с'
+        )
@@ -0,0 +1,426 @@
+"""
+Синтетические данные для нагрузочных замеров.
+
+Популярность авторов, рецептов и продуктов распределена по степенному
+закону (вес объекта ранга r - r ** -exponent, ранги - случайная
+перестановка), размеры избранного, списков покупок и подписок
+пользователей - по распределению Парето с заданным средним. Каждая
+пачка строк генерируется своим генератором numpy, инициализированным
+(seed, этап, номер пачки), поэтому при тех же параметрах получаются
+те же данные независимо от числа процессов и порядка их работы.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from constants import RECIPES_BATCH_SIZE
+from recipes.documents import schedule_rebuild
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Subscriber, User)
+
+PLACEHOLDER_COUNT = 16
+PLACEHOLDER_SIZE = 8
+HISTORY_DAYS = 730
+ACTIVITY_DAYS = 90
+USERS, RECIPES, RELATIONS = 1, 2, 3
+
+FIRST_NAMES = ('Анна', 'Борис', 'Вера', 'Глеб', 'Дарья', 'Егор', 'Жанна',
+               'Илья', 'Ксения', 'Лев', 'Мария', 'Никита', 'Ольга', 'Павел')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+              'Петров', 'Соколов', 'Михайлов', 'Новиков', 'Фёдоров')
+ADJECTIVES = ('Домашний', 'Быстрый', 'Пряный', 'Летний', 'Зимний',
+              'Сырный', 'Овощной', 'Острый', 'Нежный', 'Праздничный')
+DISHES = ('суп', 'салат', 'пирог', 'омлет', 'плов', 'гуляш', 'рагу',
+          'борщ', 'соус', 'кекс', 'паштет', 'ризотто')
+WORDS = ('нарезать', 'обжарить', 'добавить', 'перемешать', 'довести',
+         'до', 'кипения', 'посолить', 'поперчить', 'томить', 'минут',
+         'на', 'среднем', 'огне', 'подавать', 'горячим', 'с', 'зеленью')
+
+_context = {}
+
+
+def _init_worker(context):
+    import django
+
+    django.setup()
+    _context.update(context)
+
+
+def _rng(seed, stage, batch):
+    return np.random.default_rng([seed, stage, batch])
+
+
+def power_law_cdf(rng, size, exponent):
+    """Функция распределения популярности size объектов."""
+
+    weights = (rng.permutation(size) + 1.0) ** -exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def sample(rng, cdf, size):
+    """size номеров объектов по функции распределения cdf."""
+
+    return np.minimum(
+        np.searchsorted(cdf, rng.random(size), side='right'), len(cdf) - 1
+    )
+
+
+def pareto_sizes(rng, count, mean, exponent, limit):
+    """count размеров с хвостом Парето и средним около mean."""
+
+    if mean <= 0 or limit <= 0:
+        return np.zeros(count, dtype=int)
+    scale = mean * (exponent - 1) / exponent
+    sizes = np.floor(scale * (1 + rng.pareto(exponent, count)))
+    return np.minimum(sizes, limit).astype(int)
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS, size=words)).capitalize() + '.'
+
+
+def _write(batch, *querysets):
+    """bulk_create пачек строк одной транзакцией; число строк."""
+
+    try:
+        with transaction.atomic():
+            for model, objects in querysets:
+                model.objects.bulk_create(
+                    objects, batch_size=RECIPES_BATCH_SIZE,
+                    ignore_conflicts=model is not User,
+                )
+        return sum(len(objects) for _, objects in querysets)
+    finally:
+        connection.close()
+
+
+def generate_users(batch, start, count):
+    rng = _rng(_context['seed'], USERS, batch)
+    prefix = _context['prefix']
+    users = []
+    for index in range(start, start + count):
+        user = User(
+            username=f'{prefix}{index:08d}',
+            email=f'{prefix}{index:08d}@example.com',
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+        )
+        user.set_unusable_password()
+        users.append(user)
+    return _write(batch, (User, users))
+
+
+def generate_recipes(batch, start, count):
+    context = _context
+    rng = _rng(context['seed'], RECIPES, batch)
+    authors = context['user_ids'][sample(rng, context['author_cdf'], count)]
+    ages = rng.uniform(0, HISTORY_DAYS * 86400, count)
+    sizes = rng.integers(
+        context['min_ingredients'], context['max_ingredients'] + 1, count
+    )
+    recipes = [
+        Recipe(
+            author_id=int(author_id),
+            name=f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} '
+                 f'№{start + offset + 1}',
+            text=' '.join(
+                sentence(rng, rng.integers(5, 15))
+                for _ in range(rng.integers(2, 6))
+            ),
+            cooking_time=int(rng.integers(5, 180)),
+            image=rng.choice(context['placeholders']),
+        )
+        for offset, author_id in enumerate(authors)
+    ]
+    ingredients = [
+        np.unique(context['ingredient_ids'][
+            sample(rng, context['ingredient_cdf'], size)
+        ])
+        for size in sizes
+    ]
+    amounts = [rng.integers(1, 500, len(items)) for items in ingredients]
+    try:
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipes)
+            # auto_now_add перезаписывает дату при вставке, задаём свою.
+            for recipe, age in zip(recipes, ages):
+                recipe.pub_date = context['now'] - timedelta(seconds=age)
+            Recipe.objects.bulk_update(
+                recipes, ['pub_date'], batch_size=RECIPES_BATCH_SIZE
+            )
+            rows = [
+                IngredientRecipe(
+                    recipe_id=recipe.pk, ingredient_id=int(ingredient_id),
+                    amount=int(amount),
+                )
+                for recipe, items, recipe_amounts in zip(
+                    recipes, ingredients, amounts
+                )
+                for ingredient_id, amount in zip(items, recipe_amounts)
+            ]
+            IngredientRecipe.objects.bulk_create(
+                rows, batch_size=RECIPES_BATCH_SIZE
+            )
+            schedule_rebuild([recipe.pk for recipe in recipes])
+        return len(recipes) + len(rows)
+    finally:
+        connection.close()
+
+
+def _pick(rng, cdf, ids, size, exclude=None):
+    """До size разных id, выбранных с учётом популярности."""
+
+    picked = np.unique(ids[sample(rng, cdf, size)])
+    if exclude is not None:
+        picked = picked[picked != exclude]
+    return picked
+
+
+def generate_relations(batch, start, count):
+    context = _context
+    rng = _rng(context['seed'], RELATIONS, batch)
+    user_ids = context['user_ids'][start:start + count]
+    recipe_ids = context['recipe_ids']
+    now = context['now']
+    sizes = {
+        name: pareto_sizes(
+            rng, count, context[name], context['size_exponent'], limit
+        )
+        for name, limit in (
+            ('favorites', len(recipe_ids)),
+            ('cart', len(recipe_ids)),
+            ('subscriptions', len(context['user_ids']) - 1),
+        )
+    }
+    favorites, cart, subscriptions = [], [], []
+    for position, user_id in enumerate(user_ids):
+        user_id = int(user_id)
+        for model, rows, name in ((Favorite, favorites, 'favorites'),
+                                  (ShoppingCart, cart, 'cart')):
+            picked = _pick(rng, context['recipe_cdf'], recipe_ids,
+                           sizes[name][position])
+            ages = rng.uniform(0, ACTIVITY_DAYS * 86400, len(picked))
+            rows.extend(
+                model(user_id=user_id, recipe_id=int(recipe_id),
+                      added_at=now - timedelta(seconds=age))
+                for recipe_id, age in zip(picked, ages)
+            )
+        subscriptions.extend(
+            Subscriber(user_id=user_id, subscribed_to_id=int(author_id))
+            for author_id in _pick(
+                rng, context['author_cdf'], context['user_ids'],
+                sizes['subscriptions'][position], exclude=user_id,
+            )
+        )
+    return _write(
+        batch, (Favorite, favorites), (ShoppingCart, cart),
+        (Subscriber, subscriptions),
+    )
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД синтетическими пользователями, рецептами, '
+            'избранным, списками покупок и подписками для нагрузочных '
+            'замеров. Нужен загруженный каталог продуктов '
+            '(import_ingredients). Данные детерминированы параметром --seed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Количество рецептов',
+        )
+        parser.add_argument(
+            '--favorites-per-user', type=float, default=20,
+            help='Среднее число рецептов в избранном пользователя',
+        )
+        parser.add_argument(
+            '--cart-per-user', type=float, default=5,
+            help='Среднее число рецептов в списке покупок',
+        )
+        parser.add_argument(
+            '--subscriptions-per-user', type=float, default=10,
+            help='Среднее число подписок пользователя',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX'),
+            help='Диапазон числа продуктов в рецепте',
+        )
+        parser.add_argument(
+            '--popularity-exponent', type=float, default=1.0,
+            help='Показатель степенного закона популярности авторов, '
+                 'рецептов и продуктов',
+        )
+        parser.add_argument(
+            '--size-exponent', type=float, default=2.0,
+            help='Показатель Парето для размеров избранного, списков '
+                 'покупок и подписок (больше 1; меньше - длиннее хвост)',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Начальное значение генератора случайных чисел',
+        )
+        parser.add_argument(
+            '--prefix', default='fake',
+            help='Префикс имён и адресов создаваемых пользователей',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RECIPES_BATCH_SIZE,
+            help='Количество объектов в одной пачке (транзакции)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Количество процессов записи',
+        )
+
+    def handle(self, *args, **options):
+        low, high = options['ingredients_per_recipe']
+        if min(options['users'], options['batch_size'],
+               options['workers'], low) < 1 or high < low:
+            raise CommandError(
+                'Количества, --batch-size, --workers и диапазон продуктов '
+                'должны быть положительными.'
+            )
+        if options['size_exponent'] <= 1:
+            raise CommandError('--size-exponent должен быть больше 1.')
+        if User.objects.filter(
+            username__startswith=options['prefix']
+        ).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {options["prefix"]!r} уже '
+                'есть; задайте другой --prefix.'
+            )
+        ingredient_ids = np.array(sorted(
+            Ingredient.objects.values_list('pk', flat=True)
+        ), dtype=np.int64)
+        if not len(ingredient_ids):
+            raise CommandError(
+                'Каталог продуктов пуст; сначала выполните import_ingredients.'
+            )
+        self.workers = options['workers']
+        if self.workers > 1 and connection.vendor == 'sqlite':
+            self.stderr.write(
+                'SQLite не поддерживает параллельную запись, '
+                'используется один процесс.'
+            )
+            self.workers = 1
+        self.batch_size = options['batch_size']
+        seed = options['seed']
+        rng = _rng(seed, 0, 0)
+        context = {
+            'seed': seed,
+            'prefix': options['prefix'],
+            'now': timezone.now(),
+            'favorites': options['favorites_per_user'],
+            'cart': options['cart_per_user'],
+            'subscriptions': options['subscriptions_per_user'],
+            'size_exponent': options['size_exponent'],
+            'min_ingredients': low,
+            'max_ingredients': min(high, len(ingredient_ids)),
+            'ingredient_ids': ingredient_ids,
+            'ingredient_cdf': power_law_cdf(
+                rng, len(ingredient_ids), options['popularity_exponent']
+            ),
+            'placeholders': self.placeholders(rng),
+        }
+        started = time.perf_counter()
+        total = self.run('Пользователи', generate_users,
+                         options['users'], context)
+
+        context['user_ids'] = np.array(User.objects.filter(
+            username__startswith=options['prefix']
+        ).order_by('username').values_list('pk', flat=True), dtype=np.int64)
+        context['author_cdf'] = power_law_cdf(
+            rng, len(context['user_ids']), options['popularity_exponent']
+        )
+        total += self.run('Рецепты и продукты', generate_recipes,
+                          options['recipes'], context)
+
+        context['recipe_ids'] = np.array(Recipe.objects.filter(
+            author_id__in=context['user_ids'].tolist()
+        ).order_by('pub_date', 'pk').values_list('pk', flat=True),
+            dtype=np.int64)
+        if not len(context['recipe_ids']):
+            context['favorites'] = context['cart'] = 0
+            context['recipe_ids'] = np.zeros(1, dtype=np.int64)
+        context['recipe_cdf'] = power_law_cdf(
+            rng, len(context['recipe_ids']), options['popularity_exponent']
+        )
+        total += self.run('Избранное, покупки, подписки', generate_relations,
+                          len(context['user_ids']), context)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Строк: {total}, время: {elapsed:.1f} с, '
+            f'{total / elapsed:.0f} строк/с.'
+        ))
+
+    def placeholders(self, rng):
+        """Маленькие однотонные PNG, общие для всех рецептов."""
+
+        upload_to = Recipe._meta.get_field('image').upload_to
+        names = []
+        for number in range(PLACEHOLDER_COUNT):
+            name = f'{upload_to}placeholder_{number}.png'
+            color = tuple(int(value) for value in rng.integers(0, 256, 3))
+            if not default_storage.exists(name):
+                image = BytesIO()
+                Image.new(
+                    'RGB', (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), color
+                ).save(image, 'PNG')
+                name = default_storage.save(
+                    name, ContentFile(image.getvalue())
+                )
+            names.append(name)
+        return names
+
+    def run(self, title, generate, count, context):
+        """Выполняет generate по пачкам в пуле процессов; число строк."""
+
+        tasks = [
+            (batch, start, min(self.batch_size, count - start))
+            for batch, start in enumerate(range(0, count, self.batch_size))
+        ]
+        started = time.perf_counter()
+        rows = 0
+        if self.workers == 1:
+            _context.update(context)
+            results = (generate(*task) for task in tasks)
+        else:
+            # Дочерние процессы не должны унаследовать открытые соединения.
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                self.workers, initializer=_init_worker, initargs=(context,)
+            )
+            results = pool.map(generate, *zip(*tasks)) if tasks else ()
+        try:
+            for done, result in enumerate(results, start=1):
+                rows += result
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'... {title}: пачек {done} из {len(tasks)}, '
+                    f'строк {rows} ({rows / elapsed:.0f} строк/с)'
+                )
+        finally:
+            if self.workers > 1:
+                pool.shutdown()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: строк {rows} за {elapsed:.1f} с '
+            f'({rows / elapsed if elapsed else 0:.0f} строк/с).'
+        ))
+        return rows
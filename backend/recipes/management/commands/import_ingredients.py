@@ -0,0 +1,239 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from constants import IMPORT_CHUNK_SIZE
+from recipes.models import Ingredient
+from backend_foodgram.settings import CSV_FILES_DIR
+
+FORMATS = ('csv', 'json', 'jsonl')
+JSON_READ_SIZE = 64 * 1024
+JSON_SEPARATORS = ' \t\r\n,'
+
+
+def iter_csv(stream):
+    """Построчно читает CSV без заголовка: название, единица измерения."""
+
+    for row in csv.reader(stream):
+        if row:
+            yield row[0], row[1] if len(row) > 1 else ''
+
+
+def ingredient_fields(item, position):
+    """Название и единица из JSON-объекта; position - для сообщения."""
+
+    if not isinstance(item, dict):
+        raise CommandError(
+            f'{position}: ожидался объект, получено: {json.dumps(item)[:100]}'
+        )
+    return item.get('name', ''), item.get('measurement_unit', '')
+
+
+def iter_jsonl(stream):
+    """Построчно читает JSON Lines, по одному объекту в строке."""
+
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield ingredient_fields(json.loads(line), f'Строка {number}')
+
+
+def iter_json(stream):
+    """
+    Потоково разбирает JSON-массив объектов, не загружая файл целиком.
+    Пустой файл считается пустым массивом.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer, position, opened = '', 0, False
+    index = 0
+    while True:
+        chunk = stream.read(JSON_READ_SIZE)
+        buffer, position = buffer[position:] + chunk, 0
+        while True:
+            while (position < len(buffer)
+                   and buffer[position] in JSON_SEPARATORS):
+                position += 1
+            if position == len(buffer):
+                break
+            if not opened:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив объектов.')
+                opened, position = True, position + 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Некорректный JSON в конце файла.')
+                break
+            index += 1
+            yield ingredient_fields(item, f'Элемент {index}')
+        if not chunk:
+            if opened:
+                raise CommandError('JSON-массив не закрыт.')
+            return
+
+
+READERS = {'csv': iter_csv, 'json': iter_json, 'jsonl': iter_jsonl}
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает продукты из CSV/JSON/JSONL: '
+            'COPY + INSERT ... ON CONFLICT в Postgres, '
+            'пакетный bulk_create в остальных СУБД')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=str(Path(CSV_FILES_DIR) / 'ingredients.csv'),
+            help='Путь к файлу (по умолчанию data/ingredients.csv)',
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+            help='Количество строк в одной пачке',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным.')
+
+        load_chunk = (
+            self._load_chunk_postgres if connection.vendor == 'postgresql'
+            else self._load_chunk_bulk_create
+        )
+        total = inserted = invalid = 0
+        # bulk_create с ignore_conflicts не сообщает, сколько строк
+        # вставлено: считаем по разнице до и после загрузки.
+        before = (
+            None if connection.vendor == 'postgresql'
+            else Ingredient.objects.count()
+        )
+        started = time.perf_counter()
+        try:
+            with open(path, encoding='utf-8', newline='') as stream:
+                rows = READERS[file_format](stream)
+                self._prepare()
+                try:
+                    while chunk := list(
+                        islice(rows, options['chunk_size'])
+                    ):
+                        valid = self._clean(chunk)
+                        invalid += len(chunk) - len(valid)
+                        total += len(chunk)
+                        with transaction.atomic():
+                            inserted += load_chunk(valid)
+                        self._report(
+                            total, inserted, started, exact=before is None
+                        )
+                finally:
+                    self._cleanup()
+        except FileNotFoundError:
+            raise CommandError(f'Файл не найден: {path}')
+        except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+            raise CommandError(f'Ошибка разбора файла {path}: {e}')
+        if before is not None:
+            inserted = Ingredient.objects.count() - before
+
+        self.stdout.write(self.style.SUCCESS(
+            self._summary(total, inserted, invalid, started)
+        ))
+
+    @staticmethod
+    def _clean(chunk):
+        """Нормализует строки и отбрасывает неполные."""
+
+        max_name = Ingredient._meta.get_field('name').max_length
+        max_unit = Ingredient._meta.get_field('measurement_unit').max_length
+        cleaned = []
+        for name, unit in chunk:
+            name, unit = str(name).strip(), str(unit).strip()
+            if name and unit and len(name) <= max_name \
+                    and len(unit) <= max_unit:
+                cleaned.append((name, unit))
+        return cleaned
+
+    def _prepare(self):
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name text, measurement_unit text)'
+            )
+
+    def _cleanup(self):
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS ingredient_staging')
+
+    @staticmethod
+    def _load_chunk_postgres(rows):
+        """COPY пачки во временную таблицу и вставка без дубликатов."""
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        copy_sql = ('COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)')
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE ingredient_staging')
+            if hasattr(cursor.cursor, 'copy_expert'):
+                cursor.copy_expert(copy_sql, buffer)
+            else:
+                with cursor.copy(copy_sql) as copy:
+                    copy.write(buffer.getvalue())
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_staging '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            return cursor.rowcount
+
+    @staticmethod
+    def _load_chunk_bulk_create(rows):
+        """
+        Запасной путь для SQLite: пакетный bulk_create. Возвращает число
+        отправленных строк, включая пропущенные дубликаты.
+        """
+
+        return len(Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in rows],
+            batch_size=IMPORT_CHUNK_SIZE,
+            ignore_conflicts=True,
+        ))
+
+    @staticmethod
+    def _summary(total, inserted, invalid, started):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        return (f'Готово. Обработано: {total}, добавлено: {inserted}, '
+                f'пропущено дубликатов: {total - inserted - invalid}, '
+                f'некорректных: {invalid}, '
+                f'{total / elapsed:.0f} строк/с')
+
+    def _report(self, total, inserted, started, exact):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(
+            f'... обработано {total}, '
+            f'{"добавлено" if exact else "записано"} {inserted} '
+            f'({total / elapsed:.0f} строк/с)'
+        )
@@ -0,0 +1,223 @@
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from constants import RECIPES_BATCH_SIZE
+from recipes.documents import schedule_rebuild
+from recipes.models import Ingredient, IngredientRecipe, Recipe, User
+
+
+SKIP_REASONS = {
+    'author': 'неизвестный автор',
+    'ingredients': 'неизвестные продукты',
+    'image': 'нет файла картинки',
+}
+
+
+def iter_documents(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из JSONL, выгруженного export_recipes, '
+            'пачками bulk_create в транзакциях')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL')
+        parser.add_argument(
+            '--images-dir',
+            help='Каталог с картинками, выгруженными export_recipes',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RECIPES_BATCH_SIZE,
+            help='Количество рецептов в одной транзакции',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество параллельных потоков записи',
+        )
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Создавать отсутствующих авторов без пароля',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError(
+                '--batch-size и --workers должны быть положительными.'
+            )
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stderr.write(
+                'SQLite не поддерживает параллельную запись, '
+                'используется один поток.'
+            )
+            workers = 1
+        self.images_dir = (
+            Path(options['images_dir']) if options['images_dir'] else None
+        )
+        self.create_authors = options['create_authors']
+        self.upload_to = Recipe._meta.get_field('image').upload_to
+        # Потоки не должны одновременно проверять и сохранять один файл:
+        # второй получил бы копию с суффиксом в имени.
+        self.images_lock = threading.Lock()
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('pk', 'name', 'measurement_unit')
+        }
+
+        imported, skipped = 0, Counter()
+        started = time.perf_counter()
+        try:
+            stream = open(options['path'], encoding='utf-8')
+        except FileNotFoundError:
+            raise CommandError(f'Файл не найден: {options["path"]}')
+        with stream, ThreadPoolExecutor(workers) as executor:
+            documents = iter_documents(stream)
+            pending = set()
+            while batch := list(islice(documents, options['batch_size'])):
+                pending.add(executor.submit(self._import_batch, batch))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        created, rejected = future.result()
+                        imported += created
+                        skipped.update(rejected)
+                    self._report(imported, skipped, started)
+            for future in pending:
+                created, rejected = future.result()
+                imported += created
+                skipped.update(rejected)
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Загружено рецептов: {imported}, '
+            f'пропущено: {skipped.total()}, '
+            f'{imported / elapsed:.0f} рецептов/с'
+        ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                'Пропущены: ' + ', '.join(
+                    f'{SKIP_REASONS[reason]} - {count}'
+                    for reason, count in skipped.items()
+                )
+            ))
+
+    def _report(self, imported, skipped, started):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(
+            f'... загружено {imported}, пропущено {skipped.total()} '
+            f'({imported / elapsed:.0f} рецептов/с)'
+        )
+
+    def _import_batch(self, documents):
+        """Записывает пачку рецептов одной транзакцией в своём потоке."""
+
+        try:
+            with transaction.atomic():
+                return self._write_batch(documents)
+        finally:
+            connection.close()
+
+    def _write_batch(self, documents):
+        authors = self._resolve_authors(documents)
+        recipes, pub_dates, ingredients = [], [], []
+        skipped = Counter()
+        for document in documents:
+            author_id = authors.get(document['author']['email'])
+            recipe_ingredients = [
+                (self.ingredients.get(
+                    (item['name'], item['measurement_unit'])
+                ), item['amount'])
+                for item in document['ingredients']
+            ]
+            if author_id is None:
+                skipped['author'] += 1
+                continue
+            if any(pk is None for pk, _ in recipe_ingredients):
+                skipped['ingredients'] += 1
+                continue
+            image = self._store_image(document.get('image'))
+            if image is None:
+                skipped['image'] += 1
+                continue
+            recipes.append(Recipe(
+                author_id=author_id,
+                name=document['name'],
+                text=document['text'],
+                cooking_time=document['cooking_time'],
+                image=image,
+            ))
+            pub_dates.append(parse_datetime(document['pub_date']))
+            ingredients.append(recipe_ingredients)
+
+        Recipe.objects.bulk_create(recipes)
+        # auto_now_add перезаписывает дату при вставке, возвращаем исходную.
+        for recipe, pub_date in zip(recipes, pub_dates):
+            recipe.pub_date = pub_date
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for recipe, recipe_ingredients in zip(recipes, ingredients)
+            for ingredient_id, amount in recipe_ingredients
+        )
+        schedule_rebuild([recipe.pk for recipe in recipes])
+        return len(recipes), skipped
+
+    def _resolve_authors(self, documents):
+        """Находит авторов пачки одним запросом, создавая недостающих."""
+
+        authors_data = {
+            document['author']['email']: document['author']
+            for document in documents
+        }
+        authors = dict(
+            User.objects.filter(email__in=authors_data)
+            .values_list('email', 'pk')
+        )
+        missing = authors_data.keys() - authors.keys()
+        if missing and self.create_authors:
+            new_authors = [User(**authors_data[email]) for email in missing]
+            for author in new_authors:
+                author.set_unusable_password()
+            User.objects.bulk_create(new_authors, ignore_conflicts=True)
+            authors.update(
+                User.objects.filter(email__in=missing)
+                .values_list('email', 'pk')
+            )
+        return authors
+
+    def _store_image(self, reference):
+        """
+        Переносит картинку из каталога выгрузки, если её ещё нет; None,
+        если файла нет в выгрузке.
+        """
+
+        if not reference:
+            return ''
+        name = f'{self.upload_to}{reference}'
+        if self.images_dir is None:
+            return name
+        with self.images_lock:
+            if default_storage.exists(name):
+                return name
+            try:
+                with open(self.images_dir / reference, 'rb') as source:
+                    return default_storage.save(name, File(source))
+            except FileNotFoundError:
+                return None
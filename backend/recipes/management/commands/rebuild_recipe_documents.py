@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from constants import RECIPES_BATCH_SIZE
+from recipes.documents import build_documents
+from recipes.models import RecipeDocument
+from .compute_popularity import all_recipe_batches
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает готовые документы рецептов для списка и деталей '
+            'рецептов. Запускайте после загрузки данных в обход API '
+            '(import_recipes, SQL) и после изменения формата документа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Собрать только отсутствующие документы',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RECIPES_BATCH_SIZE,
+            help='Количество рецептов за один проход',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        started = time.perf_counter()
+        processed = 0
+        for batch in all_recipe_batches(options['batch_size']):
+            if options['missing']:
+                batch = sorted(set(batch) - set(
+                    RecipeDocument.objects.filter(
+                        recipe_id__in=batch
+                    ).values_list('recipe_id', flat=True)
+                ))
+            build_documents(batch)
+            processed += len(batch)
+            self.stdout.write(f'... собрано документов: {processed}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Документов: {processed}, '
+            f'время: {time.perf_counter() - started:.1f} с.'
+        ))
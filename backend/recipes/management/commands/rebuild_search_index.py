@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = ('Пересоздаёт триггеры полнотекстового поиска и заново '
+            'индексирует все рецепты. С --check только проверяет, что '
+            'триггеры на месте и все рецепты проиндексированы (триггеры '
+            'пропадают после миграций, пересоздающих таблицы рецептов).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить; ошибка, если индекс неполон',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in search.SCHEMA:
+            self.stdout.write(
+                f'Для {connection.vendor} индекса нет: поиск идёт '
+                'по названию.'
+            )
+            return
+        missing = search.missing_triggers(connection)
+        unindexed = search.unindexed_recipes(connection)
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'Нет триггеров: {", ".join(missing)}'
+            ))
+        if unindexed:
+            self.stdout.write(self.style.WARNING(
+                f'Рецептов вне индекса: {unindexed}'
+            ))
+        if options['check']:
+            if missing or unindexed:
+                raise CommandError(
+                    'Индекс поиска неполон; выполните rebuild_search_index.'
+                )
+            self.stdout.write(self.style.SUCCESS('Индекс поиска в порядке.'))
+            return
+        with transaction.atomic():
+            search.install_search_index(connection)
+            search.reindex(connection)
+        self.stdout.write(self.style.SUCCESS(
+            'Готово. Триггеры пересозданы, рецепты переиндексированы.'
+        ))
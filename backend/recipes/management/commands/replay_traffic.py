@@ -0,0 +1,240 @@
+import json
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import User
+
+from .bench_requests import percentile
+
+
+def summary(timings):
+    timings = sorted(timings)
+    if not timings:
+        return {}
+    return {
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Воспроизводит трафик, записанный TrafficRecorderMiddleware '
+            '(TRAFFIC_LOG_PATH), на запущенном сервере и выводит задержки '
+            'и долю ошибок по маршрутам - для сравнения релизов на реальной '
+            'смеси запросов. Запросы записанных пользователей отправляются '
+            'с их уже выданными токенами из БД, к которой подключена '
+            'команда (она должна совпадать с БД сервера); новые токены '
+            'создаются только с --create-tokens. Тела запросов не '
+            'записываются, поэтому по умолчанию воспроизводится только '
+            'чтение.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'logs', nargs='+', help='Файлы журнала трафика (JSONL)',
+        )
+        parser.add_argument(
+            '--base-url', default='http://127.0.0.1:8000',
+            help='Адрес сервера',
+        )
+        parser.add_argument(
+            '-c', '--concurrency', type=int, default=20,
+            help='Количество одновременных соединений',
+        )
+        parser.add_argument(
+            '--speed', type=float, default=0,
+            help='Темп относительно записи: 1 - как в записи, 2 - вдвое '
+                 'быстрее, 0 - без пауз между запросами',
+        )
+        parser.add_argument(
+            '--methods', nargs='+', default=['GET', 'HEAD'],
+            help='Воспроизводимые методы',
+        )
+        parser.add_argument(
+            '--limit', type=int, help='Воспроизвести первые N запросов',
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Отправлять все запросы без авторизации',
+        )
+        parser.add_argument(
+            '--create-tokens', action='store_true',
+            help='Выдать токены записанным пользователям, у которых их нет '
+                 '(это действующие токены входа - только для тестовых БД)',
+        )
+        parser.add_argument(
+            '--report', help='Сохранить итоги в JSON для сравнения релизов',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['speed'] < 0 \
+                or (options['limit'] is not None and options['limit'] < 1):
+            raise CommandError(
+                '--concurrency и --limit должны быть положительными, '
+                '--speed - неотрицательным.'
+            )
+        entries = self.load(options)
+        if not entries:
+            raise CommandError('В журнале нет запросов для воспроизведения.')
+        tokens = {} if options['anonymous'] else self.tokens(
+            entries, options['create_tokens']
+        )
+        base_url = options['base_url'].rstrip('/')
+        speed = options['speed']
+        first = entries[0]['ts']
+        local = threading.local()
+
+        def fetch(entry):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            if speed:
+                delay = (entry['ts'] - first) / speed - (
+                    time.perf_counter() - started
+                )
+                if delay > 0:
+                    time.sleep(delay)
+            token = tokens.get(entry.get('user'))
+            url = base_url + entry['path']
+            if entry.get('query'):
+                url += '?' + entry['query']
+            request_started = time.perf_counter()
+            try:
+                response = session.request(
+                    entry['method'], url, allow_redirects=False,
+                    headers={'Authorization': f'Token {token}'} if token
+                    else {},
+                )
+            except requests.RequestException:
+                status = None
+            else:
+                status = response.status_code
+            return (time.perf_counter() - request_started) * 1000, status
+
+        self.stdout.write(
+            f'Запросов: {len(entries)}, пользователей с токенами: '
+            f'{len(tokens)}, сервер: {base_url}'
+        )
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(fetch, entries))
+        elapsed = time.perf_counter() - started
+        report = self.report(entries, results, elapsed)
+        if options['report']:
+            Path(options['report']).write_text(
+                json.dumps(report, ensure_ascii=False, indent=2)
+            )
+            self.stdout.write(f'Итоги сохранены в {options["report"]}.')
+
+    def load(self, options):
+        """Записи журналов нужных методов в порядке времени."""
+
+        methods = {method.upper() for method in options['methods']}
+        entries, skipped = [], 0
+        for log in options['logs']:
+            try:
+                with open(log, encoding='utf-8') as lines:
+                    for line in lines:
+                        try:
+                            entry = json.loads(line)
+                            if entry['method'] in methods \
+                                    and entry['path'].startswith('/'):
+                                entry['ts'] = float(entry['ts'])
+                                entries.append(entry)
+                        except (ValueError, KeyError, TypeError,
+                                AttributeError):
+                            skipped += 1
+            except OSError as error:
+                raise CommandError(f'Не удалось прочитать {log}: {error}')
+        if skipped:
+            self.stderr.write(f'Пропущено повреждённых строк: {skipped}')
+        entries.sort(key=lambda entry: entry['ts'])
+        return entries[:options['limit']]
+
+    def tokens(self, entries, create):
+        """
+        Токены записанных пользователей из БД. Недостающие токены
+        создаются только при create: это настоящие токены входа.
+        """
+
+        user_ids = {entry['user'] for entry in entries} - {None}
+        tokens = dict(Token.objects.filter(
+            user_id__in=user_ids, user__is_active=True
+        ).values_list('user_id', 'key'))
+        if create:
+            for user in User.objects.filter(
+                pk__in=user_ids - tokens.keys(), is_active=True
+            ):
+                tokens[user.pk] = Token.objects.get_or_create(
+                    user=user
+                )[0].key
+        missing = len(user_ids) - len(tokens)
+        if missing:
+            self.stderr.write(
+                f'Нет токена или активного пользователя в БД: {missing}, '
+                'их запросы отправляются без авторизации'
+                + ('.' if create else ' (выдать токены: --create-tokens).')
+            )
+        return tokens
+
+    def report(self, entries, results, elapsed):
+        routes = defaultdict(lambda: {
+            'timings': [], 'recorded': [], 'errors': 0, 'mismatched': 0,
+        })
+        for entry, (timing, status) in zip(entries, results):
+            route = routes[entry['method'], entry.get('route', entry['path'])]
+            route['timings'].append(timing)
+            if entry.get('duration_ms') is not None:
+                route['recorded'].append(entry['duration_ms'])
+            if status is None or status >= 500:
+                route['errors'] += 1
+            if status != entry.get('status'):
+                route['mismatched'] += 1
+        errors = sum(route['errors'] for route in routes.values())
+        self.stdout.write(
+            f'Всего: {len(results)} запросов за {elapsed:.1f} с, '
+            f'{len(results) / elapsed:.1f} запросов/с, ошибок {errors} '
+            f'({errors / len(results):.1%})'
+        )
+        report = {
+            'requests': len(results),
+            'seconds': round(elapsed, 3),
+            'errors': errors,
+            'overall': summary(timing for timing, _ in results),
+            'routes': [],
+        }
+        for (method, name), route in sorted(
+            routes.items(), key=lambda item: -len(item[1]['timings'])
+        ):
+            count = len(route['timings'])
+            replayed = summary(route['timings'])
+            recorded = summary(route['recorded'])
+            report['routes'].append({
+                'method': method,
+                'route': name,
+                'requests': count,
+                'errors': route['errors'],
+                'status_mismatches': route['mismatched'],
+                'replayed': replayed,
+                'recorded': recorded,
+            })
+            line = (
+                f'{method} {name}: {count} запросов, ошибок '
+                f'{route["errors"] / count:.1%}, статус не совпал '
+                f'{route["mismatched"]}, p50 {replayed["p50_ms"]:.1f} мс, '
+                f'p95 {replayed["p95_ms"]:.1f} мс, '
+                f'p99 {replayed["p99_ms"]:.1f} мс'
+            )
+            if recorded:
+                line += f' (в записи p95 {recorded["p95_ms"]:.1f} мс)'
+            self.stdout.write(line)
+        return report
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_alter_user_options_alter_ingredientrecipe_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortLinkStat',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='short_link_stat', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('clicks', models.PositiveBigIntegerField(default=0, verbose_name='Переходы')),
+            ],
+            options={
+                'verbose_name': 'переходы по короткой ссылке',
+                'verbose_name_plural': 'Переходы по коротким ссылкам',
+            },
+        ),
+    ]
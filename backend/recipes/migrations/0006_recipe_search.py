@@ -0,0 +1,183 @@
+"""
+Индексы полнотекстового поиска (recipes/search.py) и триггеры,
+которые поддерживают их при любых изменениях рецептов и продуктов.
+"""
+from django.db import migrations
+
+POSTGRES_INGREDIENT_NAMES = """
+    coalesce((
+        SELECT string_agg(i.name, ' ')
+        FROM recipes_ingredientrecipe ir
+        JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = {recipe_id}
+    ), '')
+"""
+POSTGRES_VECTOR = f"""
+    setweight(to_tsvector('russian', {{name}}), 'A')
+    || setweight(to_tsvector('russian', {POSTGRES_INGREDIENT_NAMES}), 'B')
+    || setweight(to_tsvector('russian', {{text}}), 'C')
+"""
+
+POSTGRES_FORWARD = [
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    f"""
+    CREATE FUNCTION recipes_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {POSTGRES_VECTOR.format(
+            name='NEW.name', text='NEW.text', recipe_id='NEW.id'
+        )};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_search_vector
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector()
+    """,
+    # Продукты добавляются пачкой после рецепта: пересчитываем вектор
+    # один раз на оператор, а не на каждую строку.
+    f"""
+    CREATE FUNCTION recipes_ingredientrecipe_search_vector()
+    RETURNS trigger AS $$
+    BEGIN
+        UPDATE recipes_recipe r SET search_vector = {POSTGRES_VECTOR.format(
+            name='r.name', text='r.text', recipe_id='r.id'
+        )}
+        WHERE r.id IN (SELECT recipe_id FROM changed_rows);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_ingredientrecipe_search_insert
+    AFTER INSERT ON recipes_ingredientrecipe
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_ingredientrecipe_search_vector()
+    """,
+    """
+    CREATE TRIGGER recipes_ingredientrecipe_search_delete
+    AFTER DELETE ON recipes_ingredientrecipe
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_ingredientrecipe_search_vector()
+    """,
+    f"""
+    UPDATE recipes_recipe r SET search_vector = {POSTGRES_VECTOR.format(
+        name='r.name', text='r.text', recipe_id='r.id'
+    )}
+    """,
+    """
+    CREATE INDEX recipes_recipe_search_vector_gin
+    ON recipes_recipe USING gin (search_vector)
+    """,
+]
+POSTGRES_BACKWARD = [
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_search_delete '
+    'ON recipes_ingredientrecipe',
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_search_insert '
+    'ON recipes_ingredientrecipe',
+    'DROP FUNCTION IF EXISTS recipes_ingredientrecipe_search_vector()',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector()',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+]
+
+SQLITE_INGREDIENT_NAMES = """
+    coalesce((
+        SELECT group_concat(i.name, ' ')
+        FROM recipes_ingredientrecipe ir
+        JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = {recipe_id}
+    ), '')
+"""
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE recipes_recipe_fts
+    USING fts5(name, ingredients, text, tokenize='unicode61')
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts(rowid, name, ingredients, text)
+        VALUES (NEW.id, NEW.name, '', NEW.text);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        UPDATE recipes_recipe_fts SET name = NEW.name, text = NEW.text
+        WHERE rowid = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        DELETE FROM recipes_recipe_fts WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER recipes_ingredientrecipe_fts_insert
+    AFTER INSERT ON recipes_ingredientrecipe BEGIN
+        UPDATE recipes_recipe_fts
+        SET ingredients = {SQLITE_INGREDIENT_NAMES.format(
+            recipe_id='NEW.recipe_id'
+        )}
+        WHERE rowid = NEW.recipe_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER recipes_ingredientrecipe_fts_delete
+    AFTER DELETE ON recipes_ingredientrecipe BEGIN
+        UPDATE recipes_recipe_fts
+        SET ingredients = {SQLITE_INGREDIENT_NAMES.format(
+            recipe_id='OLD.recipe_id'
+        )}
+        WHERE rowid = OLD.recipe_id;
+    END
+    """,
+    f"""
+    INSERT INTO recipes_recipe_fts(rowid, name, ingredients, text)
+    SELECT r.id, r.name, {SQLITE_INGREDIENT_NAMES.format(
+        recipe_id='r.id'
+    )}, r.text
+    FROM recipes_recipe r
+    """,
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_ingredientrecipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+]
+
+SCHEMA = {
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def create_search_index(apps, schema_editor):
+    forward, _ = SCHEMA.get(schema_editor.connection.vendor, ((), ()))
+    for statement in forward:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    _, backward = SCHEMA.get(schema_editor.connection.vendor, ((), ()))
+    for statement in backward:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shortlinkstat'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipes',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similar', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('neighbours', models.JSONField(default=list, verbose_name='Похожие рецепты [[id, сходство], ...]')),
+                ('built_row_id', models.BigIntegerField(db_index=True, default=0, verbose_name='Последняя учтённая строка продуктов в рецептах')),
+            ],
+            options={
+                'verbose_name': 'похожие рецепты',
+                'verbose_name_plural': 'Похожие рецепты',
+            },
+        ),
+    ]
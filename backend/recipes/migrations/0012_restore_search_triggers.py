@@ -0,0 +1,98 @@
+"""
+В SQLite AlterField из 0010_hot_query_indexes пересоздаёт таблицу
+recipes_recipe и удаляет триггеры поиска из 0006_recipe_search:
+восстанавливаем их и переиндексируем рецепты. В PostgreSQL таблица
+не пересоздаётся, и триггеры остаются на месте.
+"""
+from django.db import migrations
+
+SQLITE_INGREDIENT_NAMES = """
+    coalesce((
+        SELECT group_concat(i.name, ' ')
+        FROM recipes_ingredientrecipe ir
+        JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = {recipe_id}
+    ), '')
+"""
+SQLITE_TRIGGERS = {
+    'recipes_recipe_fts_insert': """
+        CREATE TRIGGER recipes_recipe_fts_insert
+        AFTER INSERT ON recipes_recipe BEGIN
+            INSERT INTO recipes_recipe_fts(rowid, name, ingredients, text)
+            VALUES (NEW.id, NEW.name, '', NEW.text);
+        END
+    """,
+    'recipes_recipe_fts_update': """
+        CREATE TRIGGER recipes_recipe_fts_update
+        AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+            UPDATE recipes_recipe_fts SET name = NEW.name, text = NEW.text
+            WHERE rowid = NEW.id;
+        END
+    """,
+    'recipes_recipe_fts_delete': """
+        CREATE TRIGGER recipes_recipe_fts_delete
+        AFTER DELETE ON recipes_recipe BEGIN
+            DELETE FROM recipes_recipe_fts WHERE rowid = OLD.id;
+        END
+    """,
+    'recipes_ingredientrecipe_fts_insert': f"""
+        CREATE TRIGGER recipes_ingredientrecipe_fts_insert
+        AFTER INSERT ON recipes_ingredientrecipe BEGIN
+            UPDATE recipes_recipe_fts
+            SET ingredients = {SQLITE_INGREDIENT_NAMES.format(
+                recipe_id='NEW.recipe_id'
+            )}
+            WHERE rowid = NEW.recipe_id;
+        END
+    """,
+    'recipes_ingredientrecipe_fts_delete': f"""
+        CREATE TRIGGER recipes_ingredientrecipe_fts_delete
+        AFTER DELETE ON recipes_ingredientrecipe BEGIN
+            UPDATE recipes_recipe_fts
+            SET ingredients = {SQLITE_INGREDIENT_NAMES.format(
+                recipe_id='OLD.recipe_id'
+            )}
+            WHERE rowid = OLD.recipe_id;
+        END
+    """,
+}
+SQLITE_REINDEX = [
+    'DELETE FROM recipes_recipe_fts',
+    f"""
+    INSERT INTO recipes_recipe_fts(rowid, name, ingredients, text)
+    SELECT r.id, r.name, {SQLITE_INGREDIENT_NAMES.format(
+        recipe_id='r.id'
+    )}, r.text
+    FROM recipes_recipe r
+    """,
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        )
+        existing = {name for name, in cursor.fetchall()}
+    if set(SQLITE_TRIGGERS) <= existing:
+        return
+    for name, statement in SQLITE_TRIGGERS.items():
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute(statement)
+    for statement in SQLITE_REINDEX:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            restore_search_triggers, migrations.RunPython.noop
+        ),
+    ]
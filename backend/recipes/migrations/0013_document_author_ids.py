@@ -0,0 +1,35 @@
+"""
+Профиль автора больше не копируется в документы рецептов, а
+подставляется при чтении: оставляем в документах только id автора.
+"""
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def strip_author_profiles(apps, schema_editor):
+    RecipeDocument = apps.get_model('recipes', 'RecipeDocument')
+    documents = RecipeDocument.objects.using(
+        schema_editor.connection.alias
+    ).order_by('pk')
+    last_pk = 0
+    while batch := list(documents.filter(pk__gt=last_pk)[:BATCH_SIZE]):
+        for document in batch:
+            document.data['author'] = {'id': document.data['author']['id']}
+        RecipeDocument.objects.using(
+            schema_editor.connection.alias
+        ).bulk_update(batch, ['data'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_restore_search_triggers'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            strip_author_profiles, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,94 @@
+"""
+Переименование продукта каталога обновляет индекс поиска всех
+рецептов с этим продуктом (триггеры 0006_recipe_search следят только
+за рецептами и их составом).
+"""
+from django.db import migrations
+
+POSTGRES_VECTOR = """
+    setweight(to_tsvector('russian', r.name), 'A')
+    || setweight(to_tsvector('russian', coalesce((
+        SELECT string_agg(i.name, ' ')
+        FROM recipes_ingredientrecipe ir
+        JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = r.id
+    ), '')), 'B')
+    || setweight(to_tsvector('russian', r.text), 'C')
+"""
+POSTGRES_FORWARD = [
+    f"""
+    CREATE FUNCTION recipes_ingredient_search_vector()
+    RETURNS trigger AS $$
+    BEGIN
+        UPDATE recipes_recipe r SET search_vector = {POSTGRES_VECTOR}
+        WHERE r.id IN (
+            SELECT recipe_id FROM recipes_ingredientrecipe
+            WHERE ingredient_id = NEW.id
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_ingredient_search_rename
+    AFTER UPDATE OF name ON recipes_ingredient
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION recipes_ingredient_search_vector()
+    """,
+]
+POSTGRES_BACKWARD = [
+    'DROP TRIGGER IF EXISTS recipes_ingredient_search_rename '
+    'ON recipes_ingredient',
+    'DROP FUNCTION IF EXISTS recipes_ingredient_search_vector()',
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE TRIGGER recipes_ingredient_fts_rename
+    AFTER UPDATE OF name ON recipes_ingredient
+    WHEN OLD.name IS NOT NEW.name BEGIN
+        UPDATE recipes_recipe_fts
+        SET ingredients = coalesce((
+            SELECT group_concat(i.name, ' ')
+            FROM recipes_ingredientrecipe ir
+            JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+            WHERE ir.recipe_id = recipes_recipe_fts.rowid
+        ), '')
+        WHERE rowid IN (
+            SELECT recipe_id FROM recipes_ingredientrecipe
+            WHERE ingredient_id = NEW.id
+        );
+    END
+    """,
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS recipes_ingredient_fts_rename',
+]
+
+SCHEMA = {
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def create_triggers(apps, schema_editor):
+    forward, _ = SCHEMA.get(schema_editor.connection.vendor, ((), ()))
+    for statement in forward:
+        schema_editor.execute(statement)
+
+
+def drop_triggers(apps, schema_editor):
+    _, backward = SCHEMA.get(schema_editor.connection.vendor, ((), ()))
+    for statement in backward:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_document_author_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
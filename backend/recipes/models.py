@@ -5,6 +5,7 @@ from django.core.validators import (
     RegexValidator, EmailValidator
 )
 from django.db import models
+from django.utils import timezone
 
 class User(AbstractUser):
     """Модель пользователя."""
@@ -49,6 +50,10 @@ class User(AbstractUser):
         ordering = [Upper('email')]
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            # Уникальный индекс по email не подходит для ORDER BY UPPER(email).
+            models.Index(Upper('email'), name='user_upper_email_idx'),
+        ]
 
     def __str__(self):
         return (f"{self.username}, {self.email}, "
@@ -69,12 +74,20 @@ class Subscriber(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='subscriptions_of',
+        db_index=False,
         verbose_name='Подписки'
     )
 
     class Meta:
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
+        indexes = [
+            # Подписчики автора; заменяет индекс внешнего ключа.
+            models.Index(
+                fields=['subscribed_to', 'user'],
+                name='subscriber_subscribed_to_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'subscribed_to'],
@@ -119,6 +132,7 @@ class Recipe(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Автор рецепта'
     )
 
@@ -158,6 +172,16 @@ class Recipe(models.Model):
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = "recipes"
+        indexes = [
+            # Лента подписок и ?author=: последние рецепты автора.
+            # Заменяет индекс внешнего ключа author.
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            # Список рецептов без фильтров.
+            models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -212,13 +236,28 @@ class Favorite(models.Model):
     recipe = models.ForeignKey(
         to=Recipe,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Рецепт в избранном пользователя'
     )
 
+    added_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата добавления'
+    )
+
     class Meta:
         verbose_name = 'Избранное пользователя'
         verbose_name_plural = 'Избранное пользователя'
         default_related_name = 'favorites'
+        indexes = [
+            models.Index(
+                fields=['added_at'], name='favorite_added_at_idx'
+            ),
+            # Счётчики по рецепту; заменяет индекс внешнего ключа.
+            models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
@@ -242,13 +281,28 @@ class ShoppingCart(models.Model):
     recipe = models.ForeignKey(
         to=Recipe,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Рецепт'
     )
 
+    added_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата добавления'
+    )
+
     class Meta:
         verbose_name = 'список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shopping_cart_items'
+        indexes = [
+            models.Index(
+                fields=['added_at'], name='shoppingcart_added_at_idx'
+            ),
+            # Счётчики по рецепту; заменяет индекс внешнего ключа.
+            models.Index(
+                fields=['recipe', 'user'], name='shoppingcart_recipe_user_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
@@ -258,3 +312,129 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.recipe}, {self.user}'
+
+
+class ShortLinkStat(models.Model):
+    """Счётчик переходов по короткой ссылке рецепта."""
+
+    recipe = models.OneToOneField(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='short_link_stat',
+        verbose_name='Рецепт'
+    )
+
+    clicks = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Переходы'
+    )
+
+    class Meta:
+        verbose_name = 'переходы по короткой ссылке'
+        verbose_name_plural = 'Переходы по коротким ссылкам'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.clicks}'
+
+
+class RecipeScore(models.Model):
+    """Популярность рецепта, пересчитывается командой compute_popularity."""
+
+    recipe = models.OneToOneField(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт'
+    )
+
+    score = models.FloatField(
+        default=0,
+        verbose_name='Популярность'
+    )
+
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном'
+    )
+
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В списках покупок'
+    )
+
+    computed_at = models.DateTimeField(
+        verbose_name='Дата расчёта'
+    )
+
+    class Meta:
+        verbose_name = 'популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(fields=['-score'], name='recipescore_score_idx'),
+            models.Index(
+                fields=['computed_at'], name='recipescore_computed_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score}'
+
+
+class SimilarRecipes(models.Model):
+    """Похожие рецепты, строятся командой build_similarity."""
+
+    recipe = models.OneToOneField(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='similar',
+        verbose_name='Рецепт'
+    )
+
+    neighbours = models.JSONField(
+        default=list,
+        verbose_name='Похожие рецепты [[id, сходство], ...]'
+    )
+
+    built_row_id = models.BigIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Последняя учтённая строка продуктов в рецептах'
+    )
+
+    class Meta:
+        verbose_name = 'похожие рецепты'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {len(self.neighbours)}'
+
+
+class RecipeDocument(models.Model):
+    """Готовое представление рецепта для чтения (recipes/documents.py)."""
+
+    recipe = models.OneToOneField(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт'
+    )
+
+    data = models.JSONField(
+        verbose_name='Рецепт без полей, зависящих от пользователя'
+    )
+
+    built_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата сборки'
+    )
+
+    class Meta:
+        verbose_name = 'документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.built_at}'
@@ -0,0 +1,96 @@
+"""
+Популярность рецептов: добавления в избранное и в списки покупок
+с затуханием по времени (вклад добавления уменьшается вдвое каждые
+POPULARITY_HALF_LIFE_DAYS дней).
+
+Вклады хранятся отнесёнными к фиксированной дате POPULARITY_EPOCH:
+добавление в момент t весит 2 ** ((t - epoch) / half_life). Затухание
+на текущий момент - общий для всех рецептов множитель, он не меняет
+порядок, поэтому пересчитывать нужно только рецепты, у которых
+появились новые добавления. Удаления из избранного и списков покупок
+учитываются полным пересчётом (compute_popularity --full).
+Веса растут вдвое за каждый период полураспада, float выдержит около
+тысячи периодов; после этого эпоху нужно сдвинуть и пересчитать всё.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import F
+
+from constants import (POPULARITY_CART_WEIGHT, POPULARITY_FAVORITE_WEIGHT,
+                       POPULARITY_HALF_LIFE_DAYS)
+from .models import Favorite, Recipe, RecipeScore, ShoppingCart
+
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+HALF_LIFE_SECONDS = timedelta(days=POPULARITY_HALF_LIFE_DAYS).total_seconds()
+# Добавления, закоммиченные во время прошлого прогона, но с более
+# ранним added_at: пересчёт рецепта идемпотентен, перекрытие безопасно.
+INCREMENTAL_OVERLAP = timedelta(minutes=5)
+
+
+def event_weight(added_at):
+    return 2 ** ((added_at - POPULARITY_EPOCH).total_seconds()
+                 / HALF_LIFE_SECONDS)
+
+
+def touched_recipes(since):
+    """id рецептов с добавлениями в избранное или покупки после since."""
+
+    recipe_ids = set()
+    for model in (Favorite, ShoppingCart):
+        recipe_ids.update(model.objects.filter(
+            added_at__gte=since
+        ).values_list('recipe_id', flat=True).distinct())
+    return recipe_ids
+
+
+def last_computed_at():
+    last = RecipeScore.objects.order_by('-computed_at').values_list(
+        'computed_at', flat=True
+    ).first()
+    return last - INCREMENTAL_OVERLAP if last else None
+
+
+def compute_scores(recipe_ids, computed_at):
+    """Пересчитывает популярность данных рецептов с нуля."""
+
+    scores = defaultdict(float)
+    counts = {Favorite: defaultdict(int), ShoppingCart: defaultdict(int)}
+    weights = {
+        Favorite: POPULARITY_FAVORITE_WEIGHT,
+        ShoppingCart: POPULARITY_CART_WEIGHT,
+    }
+    for model, weight in weights.items():
+        for recipe_id, added_at in model.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'added_at').order_by():
+            scores[recipe_id] += weight * event_weight(added_at)
+            counts[model][recipe_id] += 1
+    existing = Recipe.objects.filter(
+        pk__in=recipe_ids
+    ).values_list('pk', flat=True)
+    RecipeScore.objects.bulk_create(
+        [
+            RecipeScore(
+                recipe_id=recipe_id,
+                score=scores[recipe_id],
+                favorites_count=counts[Favorite][recipe_id],
+                shopping_cart_count=counts[ShoppingCart][recipe_id],
+                computed_at=computed_at,
+            )
+            for recipe_id in existing
+        ],
+        update_conflicts=True,
+        unique_fields=['recipe'],
+        update_fields=[
+            'score', 'favorites_count', 'shopping_cart_count', 'computed_at'
+        ],
+    )
+
+
+def order_by_popularity(recipes):
+    """Сначала популярные; рецепты без оценки - в конце, новые первыми."""
+
+    return recipes.order_by(
+        F('score__score').desc(nulls_last=True), '-pub_date'
+    )
@@ -0,0 +1,331 @@
+"""
+Полнотекстовый поиск рецептов по названию, продуктам и описанию.
+
+В PostgreSQL индекс - столбец recipes_recipe.search_vector (tsvector,
+конфигурация russian) с GIN-индексом. В SQLite - таблица FTS5
+recipes_recipe_fts, rowid которой равен id рецепта. Оба индекса
+поддерживаются триггерами БД, поэтому остаются актуальными при любом
+способе записи: API, админка, bulk_create в командах импорта, в том
+числе при переименовании продукта каталога. Веса: название > продукты
+> описание. В остальных БД поиск идёт по вхождению в название.
+
+Столбец, таблица FTS5 и триггеры создаются сырым SQL в миграциях
+(0006_recipe_search, 0014_ingredient_search_triggers) и не входят в
+состояние моделей Django: миграция, которая пересоздаёт таблицу
+recipes_recipe, recipes_ingredientrecipe или recipes_ingredient (в
+SQLite так выполняется большинство AlterField), молча удаляет
+триггеры. Такой миграции нужен шаг RunPython, который восстанавливает
+их SQL на момент миграции (как 0012_restore_search_triggers), а не
+функциями этого модуля: он меняется вместе с кодом. Описания ниже -
+текущая схема для команды rebuild_search_index, которая проверяет и
+восстанавливает индекс.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+TERM_PATTERN = re.compile(r'\w+')
+MAX_TERMS = 8
+
+POSTGRES_INGREDIENT_NAMES = """
+    coalesce((
+        SELECT string_agg(i.name, ' ')
+        FROM recipes_ingredientrecipe ir
+        JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = {recipe_id}
+    ), '')
+"""
+POSTGRES_VECTOR = f"""
+    setweight(to_tsvector('russian', {{name}}), 'A')
+    || setweight(to_tsvector('russian', {POSTGRES_INGREDIENT_NAMES}), 'B')
+    || setweight(to_tsvector('russian', {{text}}), 'C')
+"""
+SQLITE_INGREDIENT_NAMES = """
+    coalesce((
+        SELECT group_concat(i.name, ' ')
+        FROM recipes_ingredientrecipe ir
+        JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = {recipe_id}
+    ), '')
+"""
+
+# Таблица (столбец), на которой висит триггер, и создающий его SQL.
+POSTGRES_TRIGGERS = {
+    'recipes_recipe_search_vector': ('recipes_recipe', """
+        CREATE TRIGGER recipes_recipe_search_vector
+        BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+        FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector()
+    """),
+    # Продукты добавляются пачкой после рецепта: пересчитываем вектор
+    # один раз на оператор, а не на каждую строку.
+    'recipes_ingredientrecipe_search_insert': ('recipes_ingredientrecipe', """
+        CREATE TRIGGER recipes_ingredientrecipe_search_insert
+        AFTER INSERT ON recipes_ingredientrecipe
+        REFERENCING NEW TABLE AS changed_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION recipes_ingredientrecipe_search_vector()
+    """),
+    'recipes_ingredientrecipe_search_delete': ('recipes_ingredientrecipe', """
+        CREATE TRIGGER recipes_ingredientrecipe_search_delete
+        AFTER DELETE ON recipes_ingredientrecipe
+        REFERENCING OLD TABLE AS changed_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION recipes_ingredientrecipe_search_vector()
+    """),
+    'recipes_ingredient_search_rename': ('recipes_ingredient', """
+        CREATE TRIGGER recipes_ingredient_search_rename
+        AFTER UPDATE OF name ON recipes_ingredient
+        FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+        EXECUTE FUNCTION recipes_ingredient_search_vector()
+    """),
+}
+POSTGRES_SETUP = [
+    'ALTER TABLE recipes_recipe '
+    'ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    f"""
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {POSTGRES_VECTOR.format(
+            name='NEW.name', text='NEW.text', recipe_id='NEW.id'
+        )};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION recipes_ingredientrecipe_search_vector()
+    RETURNS trigger AS $$
+    BEGIN
+        UPDATE recipes_recipe r SET search_vector = {POSTGRES_VECTOR.format(
+            name='r.name', text='r.text', recipe_id='r.id'
+        )}
+        WHERE r.id IN (SELECT recipe_id FROM changed_rows);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION recipes_ingredient_search_vector()
+    RETURNS trigger AS $$
+    BEGIN
+        UPDATE recipes_recipe r SET search_vector = {POSTGRES_VECTOR.format(
+            name='r.name', text='r.text', recipe_id='r.id'
+        )}
+        WHERE r.id IN (
+            SELECT recipe_id FROM recipes_ingredientrecipe
+            WHERE ingredient_id = NEW.id
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin
+    ON recipes_recipe USING gin (search_vector)
+    """,
+]
+POSTGRES_REINDEX = [
+    f"""
+    UPDATE recipes_recipe r SET search_vector = {POSTGRES_VECTOR.format(
+        name='r.name', text='r.text', recipe_id='r.id'
+    )}
+    """,
+]
+
+SQLITE_TRIGGERS = {
+    'recipes_recipe_fts_insert': ('recipes_recipe', """
+        CREATE TRIGGER recipes_recipe_fts_insert
+        AFTER INSERT ON recipes_recipe BEGIN
+            INSERT INTO recipes_recipe_fts(rowid, name, ingredients, text)
+            VALUES (NEW.id, NEW.name, '', NEW.text);
+        END
+    """),
+    'recipes_recipe_fts_update': ('recipes_recipe', """
+        CREATE TRIGGER recipes_recipe_fts_update
+        AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+            UPDATE recipes_recipe_fts SET name = NEW.name, text = NEW.text
+            WHERE rowid = NEW.id;
+        END
+    """),
+    'recipes_recipe_fts_delete': ('recipes_recipe', """
+        CREATE TRIGGER recipes_recipe_fts_delete
+        AFTER DELETE ON recipes_recipe BEGIN
+            DELETE FROM recipes_recipe_fts WHERE rowid = OLD.id;
+        END
+    """),
+    'recipes_ingredientrecipe_fts_insert': ('recipes_ingredientrecipe', f"""
+        CREATE TRIGGER recipes_ingredientrecipe_fts_insert
+        AFTER INSERT ON recipes_ingredientrecipe BEGIN
+            UPDATE recipes_recipe_fts
+            SET ingredients = {SQLITE_INGREDIENT_NAMES.format(
+                recipe_id='NEW.recipe_id'
+            )}
+            WHERE rowid = NEW.recipe_id;
+        END
+    """),
+    'recipes_ingredientrecipe_fts_delete': ('recipes_ingredientrecipe', f"""
+        CREATE TRIGGER recipes_ingredientrecipe_fts_delete
+        AFTER DELETE ON recipes_ingredientrecipe BEGIN
+            UPDATE recipes_recipe_fts
+            SET ingredients = {SQLITE_INGREDIENT_NAMES.format(
+                recipe_id='OLD.recipe_id'
+            )}
+            WHERE rowid = OLD.recipe_id;
+        END
+    """),
+    'recipes_ingredient_fts_rename': ('recipes_ingredient', f"""
+        CREATE TRIGGER recipes_ingredient_fts_rename
+        AFTER UPDATE OF name ON recipes_ingredient
+        WHEN OLD.name IS NOT NEW.name BEGIN
+            UPDATE recipes_recipe_fts
+            SET ingredients = {SQLITE_INGREDIENT_NAMES.format(
+                recipe_id='recipes_recipe_fts.rowid'
+            )}
+            WHERE rowid IN (
+                SELECT recipe_id FROM recipes_ingredientrecipe
+                WHERE ingredient_id = NEW.id
+            );
+        END
+    """),
+}
+SQLITE_SETUP = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts
+    USING fts5(name, ingredients, text, tokenize='unicode61')
+    """,
+]
+SQLITE_REINDEX = [
+    'DELETE FROM recipes_recipe_fts',
+    f"""
+    INSERT INTO recipes_recipe_fts(rowid, name, ingredients, text)
+    SELECT r.id, r.name, {SQLITE_INGREDIENT_NAMES.format(
+        recipe_id='r.id'
+    )}, r.text
+    FROM recipes_recipe r
+    """,
+]
+
+SCHEMA = {
+    'postgresql': (POSTGRES_SETUP, POSTGRES_TRIGGERS, POSTGRES_REINDEX),
+    'sqlite': (SQLITE_SETUP, SQLITE_TRIGGERS, SQLITE_REINDEX),
+}
+NO_SCHEMA = ((), {}, ())
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def missing_triggers(connection):
+    """Имена триггеров поиска, которых нет в БД."""
+
+    _, triggers, _ = SCHEMA.get(connection.vendor, NO_SCHEMA)
+    if not triggers:
+        return []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT tgname FROM pg_trigger WHERE NOT tgisinternal'
+            )
+        else:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+            )
+        existing = {name for name, in cursor.fetchall()}
+    return sorted(set(triggers) - existing)
+
+
+def unindexed_recipes(connection):
+    """Количество рецептов, которых нет в индексе."""
+
+    if connection.vendor not in SCHEMA:
+        return 0
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT count(*) FROM recipes_recipe '
+                'WHERE search_vector IS NULL'
+            )
+        else:
+            cursor.execute(
+                'SELECT count(*) FROM recipes_recipe WHERE id NOT IN '
+                '(SELECT rowid FROM recipes_recipe_fts)'
+            )
+        return cursor.fetchone()[0]
+
+
+def install_search_index(connection):
+    """Создаёт недостающие объекты индекса и пересоздаёт триггеры."""
+
+    setup, triggers, _ = SCHEMA.get(connection.vendor, NO_SCHEMA)
+    _execute(connection, setup)
+    for name, (table, statement) in triggers.items():
+        _execute(connection, [
+            f'DROP TRIGGER IF EXISTS {name}'
+            + (f' ON {table}' if connection.vendor == 'postgresql' else ''),
+            statement,
+        ])
+
+
+def reindex(connection):
+    """Заново заполняет индекс по всем рецептам."""
+
+    _, _, statements = SCHEMA.get(connection.vendor, NO_SCHEMA)
+    _execute(connection, statements)
+
+
+def search_terms(query):
+    """Слова запроса без операторов: ввод пользователя не попадает в SQL."""
+
+    return TERM_PATTERN.findall(query.lower())[:MAX_TERMS]
+
+
+def search_recipes(queryset, query):
+    """
+    Рецепты, содержащие все слова запроса (последнее - как префикс, для
+    поиска по мере ввода), по убыванию релевантности.
+    """
+
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        matches = RawSQL(
+            "recipes_recipe.search_vector @@ to_tsquery('russian', %s)",
+            [tsquery], output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            'ts_rank_cd(recipes_recipe.search_vector, '
+            "to_tsquery('russian', %s))",
+            [tsquery], output_field=FloatField(),
+        )
+    elif connection.vendor == 'sqlite':
+        match = ' AND '.join(
+            [f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*']
+        )
+        matches = RawSQL(
+            'recipes_recipe.id IN (SELECT rowid FROM recipes_recipe_fts '
+            'WHERE recipes_recipe_fts MATCH %s)',
+            [match], output_field=BooleanField(),
+        )
+        # bm25 тем меньше, чем запись релевантнее.
+        rank = RawSQL(
+            'SELECT -bm25(recipes_recipe_fts, 10.0, 4.0, 1.0) '
+            'FROM recipes_recipe_fts WHERE recipes_recipe_fts MATCH %s '
+            'AND rowid = recipes_recipe.id',
+            [match], output_field=FloatField(),
+        )
+    else:
+        recipes = queryset
+        for term in terms:
+            recipes = recipes.filter(name__icontains=term)
+        return recipes.order_by('-pub_date')
+    return queryset.filter(matches).alias(search_rank=rank).order_by(
+        '-search_rank', '-pub_date'
+    )
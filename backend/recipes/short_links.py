@@ -0,0 +1,197 @@
+"""
+Короткие ссылки на рецепты.
+
+Код ссылки - это id рецепта в base62, поэтому таблица кодов не нужна:
+код обратимо переводится в id без обращения к БД. Первый символ кода
+всегда буква, так что старые ссылки /link/<id> из одних цифр
+не путаются с новыми.
+
+Существование рецепта проверяется по битовой карте id в памяти
+процесса (перечитывается раз в SHORT_LINK_BITMAP_TTL секунд), в БД
+идём только за id, которых в карте нет. Переходы копятся в памяти и
+записываются в ShortLinkStat пачкой раз в
+SHORT_LINK_CLICKS_FLUSH_SECONDS секунд и при остановке воркера.
+"""
+import logging
+import string
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from backend_foodgram.lru import LRUCache
+from backend_foodgram.metrics import record_cache
+from constants import SHORT_LINK_BITMAP_TTL, SHORT_LINK_CLICKS_FLUSH_SECONDS
+from .models import Recipe, ShortLinkStat
+
+logger = logging.getLogger(__name__)
+
+LETTERS = string.ascii_lowercase + string.ascii_uppercase
+ALPHABET = LETTERS + string.digits
+BASE = len(ALPHABET)
+MISSING_CACHE_SIZE = 10000
+# Наибольший id рецепта (bigint) и длина его кода.
+MAX_RECIPE_ID = 2 ** 63 - 1
+
+
+def encode(recipe_id):
+    """id -> код: старший разряд из букв, остальные из букв и цифр."""
+
+    chars = []
+    while recipe_id >= len(LETTERS):
+        recipe_id, remainder = divmod(recipe_id, BASE)
+        chars.append(ALPHABET[remainder])
+    chars.append(LETTERS[recipe_id])
+    return ''.join(reversed(chars))
+
+
+def decode(code):
+    """Код -> id или None, если код не выдавался encode."""
+
+    # Длинный код разбирался бы за квадратичное время в id вне bigint.
+    if not code or len(code) > MAX_CODE_LENGTH or code[0] not in LETTERS \
+            or any(char not in ALPHABET for char in code):
+        return None
+    recipe_id = LETTERS.index(code[0])
+    for char in code[1:]:
+        recipe_id = recipe_id * BASE + ALPHABET.index(char)
+    # Отсекаем неканонические коды вроде 'aab' для того же id.
+    if recipe_id > MAX_RECIPE_ID or encode(recipe_id) != code:
+        return None
+    return recipe_id
+
+
+MAX_CODE_LENGTH = len(encode(MAX_RECIPE_ID))
+
+
+class RecipeBitmap:
+    """Битовая карта существующих id рецептов."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bits = None
+        self.loaded_at = 0.0
+        # Несуществующие id, чтобы перебор ссылок не нагружал БД.
+        self.missing = LRUCache(MISSING_CACHE_SIZE, SHORT_LINK_BITMAP_TTL)
+
+    def _load(self):
+        ids = list(Recipe.objects.values_list('id', flat=True).order_by())
+        bits = bytearray(max(ids, default=0) // 8 + 1)
+        for recipe_id in ids:
+            bits[recipe_id >> 3] |= 1 << (recipe_id & 7)
+        self.bits = bits
+        self.loaded_at = time.monotonic()
+
+    def _is_set(self, recipe_id):
+        index = recipe_id >> 3
+        return index < len(self.bits) \
+            and bool(self.bits[index] & (1 << (recipe_id & 7)))
+
+    def add(self, recipe_id):
+        with self.lock:
+            if self.bits is None:
+                return
+            index = recipe_id >> 3
+            if index >= len(self.bits):
+                self.bits.extend(bytes(index - len(self.bits) + 1))
+            self.bits[index] |= 1 << (recipe_id & 7)
+        self.missing.delete(recipe_id)
+
+    def discard(self, recipe_id):
+        with self.lock:
+            if self.bits is not None and recipe_id >> 3 < len(self.bits):
+                self.bits[recipe_id >> 3] &= ~(1 << (recipe_id & 7)) & 0xFF
+
+    def cached(self, recipe_id):
+        """True/False, если ответ известен без БД, иначе None."""
+
+        if self.bits is None or \
+                time.monotonic() - self.loaded_at > SHORT_LINK_BITMAP_TTL:
+            return None
+        known = True if self._is_set(recipe_id) else (
+            False if self.missing.get(recipe_id) else None
+        )
+        if known is not None:
+            record_cache('short_link', True)
+        return known
+
+    def exists(self, recipe_id):
+        known = self.cached(recipe_id)
+        if known is not None:
+            return known
+        record_cache('short_link', False)
+        with self.lock:
+            if self.bits is None or \
+                    time.monotonic() - self.loaded_at > SHORT_LINK_BITMAP_TTL:
+                self._load()
+            if self._is_set(recipe_id):
+                return True
+        # Рецепт мог появиться в другом воркере после загрузки карты.
+        if Recipe.objects.filter(pk=recipe_id).only('id').exists():
+            self.add(recipe_id)
+            return True
+        self.missing.set(recipe_id, True)
+        return False
+
+
+bitmap = RecipeBitmap()
+
+
+class ClickCounter:
+    """Переходы, ещё не записанные в БД."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.flushed_at = time.monotonic()
+
+    def add(self, recipe_id):
+        """Учитывает переход; True, если пора записать накопленное."""
+
+        with self.lock:
+            self.pending[recipe_id] += 1
+            return time.monotonic() - self.flushed_at \
+                >= SHORT_LINK_CLICKS_FLUSH_SECONDS
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return
+        # Одно UPDATE на каждое различное приращение, а не на рецепт.
+        by_increment = defaultdict(list)
+        for recipe_id, count in pending.items():
+            by_increment[count].append(recipe_id)
+        try:
+            with transaction.atomic():
+                existing = set(Recipe.objects.filter(
+                    pk__in=pending
+                ).values_list('id', flat=True))
+                ShortLinkStat.objects.bulk_create(
+                    [ShortLinkStat(recipe_id=recipe_id)
+                     for recipe_id in existing],
+                    ignore_conflicts=True,
+                )
+                for count, recipe_ids in by_increment.items():
+                    ShortLinkStat.objects.filter(
+                        recipe_id__in=recipe_ids
+                    ).update(clicks=F('clicks') + count)
+        except Exception:
+            logger.exception(
+                'Не удалось записать переходы по коротким ссылкам'
+            )
+
+
+clicks = ClickCounter()
+
+
+def recipe_added(sender, instance, created, **kwargs):
+    if created:
+        bitmap.add(instance.pk)
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    bitmap.discard(instance.pk)
@@ -0,0 +1,123 @@
+"""
+Похожие рецепты по составу продуктов.
+
+Рецепты хранятся разреженной матрицей рецепт x продукт в формате CSR
+(indptr, indices, как в scipy.sparse), сходство считается пачками
+запросов: для пачки строится плотная матрица продуктов (пачка x число
+продуктов в каталоге), пересечения со всеми рецептами получаются
+выборкой её строк по indices и суммированием по строкам CSR
+(np.add.reduceat), после чего из них считается Жаккар или косинус.
+Рецепты перебираются блоками, чтобы промежуточная матрица занимала
+не больше SIMILARITY_BLOCK_BYTES.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .models import IngredientRecipe
+
+SIMILARITY_BLOCK_BYTES = 64 * 1024 * 1024
+METRICS = ('jaccard', 'cosine')
+
+
+@dataclass
+class RecipeMatrix:
+    recipe_ids: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    column_count: int
+    last_row_id: int
+
+    @property
+    def sizes(self):
+        return np.diff(self.indptr)
+
+    def rows(self, recipe_ids):
+        """Номера строк матрицы для id рецептов (отсутствующие - пропуск)."""
+
+        positions = np.searchsorted(self.recipe_ids, recipe_ids)
+        positions = np.minimum(positions, len(self.recipe_ids) - 1)
+        return positions[self.recipe_ids[positions] == recipe_ids]
+
+
+def build_matrix():
+    rows = np.array(
+        list(IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id', 'id'
+        ).order_by().iterator(chunk_size=50000)),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    recipe_ids, row_numbers = np.unique(rows[:, 0], return_inverse=True)
+    ingredient_ids, columns = np.unique(rows[:, 1], return_inverse=True)
+    order = np.lexsort((columns, row_numbers))
+    indptr = np.zeros(len(recipe_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_numbers, minlength=len(recipe_ids)),
+              out=indptr[1:])
+    return RecipeMatrix(
+        recipe_ids=recipe_ids,
+        indptr=indptr,
+        indices=columns[order].astype(np.int32),
+        column_count=len(ingredient_ids),
+        last_row_id=int(rows[:, 2].max()) if len(rows) else 0,
+    )
+
+
+def _row_blocks(matrix, batch_size):
+    """Границы блоков рецептов, укладывающихся в SIMILARITY_BLOCK_BYTES."""
+
+    max_nonzero = max(1, SIMILARITY_BLOCK_BYTES // (4 * batch_size))
+    start = 0
+    total = len(matrix.recipe_ids)
+    while start < total:
+        end = int(np.searchsorted(
+            matrix.indptr, matrix.indptr[start] + max_nonzero, side='right'
+        )) - 1
+        end = min(max(end, start + 1), total)
+        yield start, end
+        start = end
+
+
+def nearest(matrix, query_rows, count, metric='jaccard'):
+    """
+    Для строк query_rows - массивы (пачка x count) номеров строк самых
+    похожих рецептов и их сходства, по убыванию сходства.
+    """
+
+    sizes = matrix.sizes.astype(np.float32)
+    batch = len(query_rows)
+    dense = np.zeros((matrix.column_count, batch), dtype=np.float32)
+    for position, row in enumerate(query_rows):
+        dense[matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]],
+              position] = 1
+    query_sizes = sizes[query_rows]
+    best_scores = np.full((batch, 0), -1, dtype=np.float32)
+    best_rows = np.zeros((batch, 0), dtype=np.int64)
+    for start, end in _row_blocks(matrix, batch):
+        segment = matrix.indices[matrix.indptr[start]:matrix.indptr[end]]
+        # Пересечения: сумма строк dense по продуктам каждого рецепта.
+        overlap = np.add.reduceat(
+            dense[segment], matrix.indptr[start:end] - matrix.indptr[start],
+            axis=0,
+        ).T
+        block_sizes = sizes[start:end]
+        if metric == 'cosine':
+            scores = overlap / np.sqrt(np.outer(query_sizes, block_sizes))
+        else:
+            scores = overlap / (
+                query_sizes[:, None] + block_sizes[None, :] - overlap
+            )
+        block_rows = np.arange(start, end)
+        scores[block_rows[None, :] == np.asarray(query_rows)[:, None]] = -1
+        scores = np.concatenate((best_scores, scores), axis=1)
+        rows = np.concatenate(
+            (best_rows, np.broadcast_to(block_rows, (batch, end - start))),
+            axis=1,
+        )
+        if scores.shape[1] > count:
+            keep = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            rows = np.take_along_axis(rows, keep, axis=1)
+        best_scores, best_rows = scores, rows
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return (np.take_along_axis(best_rows, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1))
@@ -1,6 +1,14 @@
+from django.conf import settings
 from django.urls import path
-from .views import short_link_recipe
+from .views import short_link_recipe, short_link_recipe_async
+
+view = (
+    short_link_recipe_async if settings.ASYNC_READ_VIEWS
+    else short_link_recipe
+)
 
 urlpatterns = [
-    path('link/<int:id>', short_link_recipe, name='resolve-short-link'),
-]
\ No newline at end of file
+    # Ссылки старого формата с id рецепта.
+    path('link/<int:id>', view, name='resolve-legacy-short-link'),
+    path('link/<str:code>', view, name='resolve-short-link'),
+]
@@ -1,9 +1,41 @@
-from django.shortcuts import get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import redirect
 
-from .models import Recipe
+from .short_links import MAX_RECIPE_ID, bitmap, clicks, decode
 
-def short_link_recipe(request, id):
-    recipe = get_object_or_404(Recipe, pk=id)
+
+def _recipe_id(code=None, id=None):
+    recipe_id = id if code is None else decode(code)
+    if recipe_id is None or recipe_id > MAX_RECIPE_ID:
+        raise Http404('No Recipe matches the given query.')
+    return recipe_id
+
+
+def _redirect(request, recipe_id):
     return redirect(
-        request.build_absolute_uri('/') + f'recipes/{recipe.id}/'
-    )
\ No newline at end of file
+        request.build_absolute_uri('/') + f'recipes/{recipe_id}/'
+    )
+
+
+def short_link_recipe(request, code=None, id=None):
+    recipe_id = _recipe_id(code, id)
+    if not bitmap.exists(recipe_id):
+        raise Http404('No Recipe matches the given query.')
+    if clicks.add(recipe_id):
+        clicks.flush()
+    return _redirect(request, recipe_id)
+
+
+async def short_link_recipe_async(request, code=None, id=None):
+    """Async-вариант для ASGI: в БД идёт только при промахе карты id."""
+
+    recipe_id = _recipe_id(code, id)
+    exists = bitmap.cached(recipe_id)
+    if exists is None:
+        exists = await sync_to_async(bitmap.exists)(recipe_id)
+    if not exists:
+        raise Http404('No Recipe matches the given query.')
+    if clicks.add(recipe_id):
+        await sync_to_async(clicks.flush)()
+    return _redirect(request, recipe_id)